@@ -0,0 +1,205 @@
+"""Batch summarization over JSONL input.
+
+Each input line is a JSON object with an id and a text field. Results are
+appended to the output JSONL file as soon as each document finishes, so a
+crashed run can be restarted with the same arguments and will skip every id
+already present in the output.
+
+    python batch.py docs.jsonl -o summaries.jsonl --concurrency 8 --rps 4
+    cat docs.jsonl | python batch.py - -o summaries.jsonl
+"""
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+from main import build_llm, resolve_ollama_base, summary_prompt_template
+
+
+class RateLimiter:
+    """Spaces call starts to at most ``rate`` per second (``rate <= 0`` disables it)."""
+
+    def __init__(self, rate: float):
+        self.interval = 1.0 / rate if rate > 0 else 0.0
+        self._next = 0.0
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        if not self.interval:
+            return
+        async with self._lock:
+            now = time.monotonic()
+            wait = self._next - now
+            self._next = max(now, self._next) + self.interval
+        if wait > 0:
+            await asyncio.sleep(wait)
+
+
+def load_done_ids(path: str, retry_errors: bool = False) -> set[str]:
+    """Return ids already present in an existing output file."""
+    done = set()
+    if not os.path.exists(path):
+        return done
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict) or record.get("id") is None:
+                continue
+            if retry_errors and "error" in record:
+                continue
+            done.add(str(record["id"]))
+    return done
+
+
+def trim_partial_line(path: str):
+    """Drop a torn trailing line (no newline) so appended records start on a fresh line."""
+    if not os.path.exists(path):
+        return
+    with open(path, "rb+") as f:
+        end = f.seek(0, os.SEEK_END)
+        pos = end
+        while pos > 0:
+            step = min(4096, pos)
+            f.seek(pos - step)
+            block = f.read(step)
+            if pos == end and block.endswith(b"\n"):
+                return
+            newline = block.rfind(b"\n")
+            if newline != -1:
+                f.truncate(pos - step + newline + 1)
+                return
+            pos -= step
+        f.truncate(0)
+
+
+async def _read_lines(stream):
+    while True:
+        line = await asyncio.to_thread(stream.readline)
+        if not line:
+            return
+        yield line
+
+
+async def run_batch(chain, source, out, concurrency: int = 4, rps: float = 0.0,
+                    timeout: float = 120.0, id_field: str = "id", text_field: str = "text",
+                    done: set[str] | None = None) -> dict:
+    """Summarize every document from ``source`` and append results to ``out``.
+
+    Documents are pulled through a bounded queue by ``concurrency`` workers, so
+    memory stays flat no matter how large the input is.
+    """
+    done = done or set()
+    limiter = RateLimiter(rps)
+    queue: asyncio.Queue = asyncio.Queue(maxsize=concurrency * 2)
+    counts = {"ok": 0, "error": 0, "skipped": 0}
+
+    def write(record: dict):
+        out.write(json.dumps(record, ensure_ascii=False) + "\n")
+        out.flush()
+
+    async def worker():
+        while True:
+            item = await queue.get()
+            if item is None:
+                return
+            doc_id, text = item
+            await limiter.acquire()
+            started = time.perf_counter()
+            try:
+                result = await asyncio.wait_for(chain.ainvoke({"information": text}), timeout)
+            except asyncio.TimeoutError:
+                record = {"id": doc_id, "error": f"timed out after {timeout} seconds"}
+                counts["error"] += 1
+            except Exception as e:
+                record = {"id": doc_id, "error": f"{type(e).__name__}: {e}"}
+                counts["error"] += 1
+            else:
+                record = {"id": doc_id, "summary": getattr(result, "content", result)}
+                counts["ok"] += 1
+            record["elapsed"] = round(time.perf_counter() - started, 3)
+            write(record)
+
+    workers = [asyncio.create_task(worker()) for _ in range(concurrency)]
+    try:
+        lineno = 0
+        async for line in _read_lines(source):
+            lineno += 1
+            if not line.strip():
+                continue
+            # ids derived from the line number get their own namespace so they never collide with real ids
+            doc_id = f"line:{lineno}"
+            try:
+                doc = json.loads(line)
+                if doc.get(id_field) is not None:
+                    doc_id = str(doc[id_field])
+                text = doc[text_field]
+                if not isinstance(text, str):
+                    raise TypeError(f"{text_field!r} is {type(text).__name__}, expected str")
+            except (ValueError, KeyError, TypeError, AttributeError) as e:
+                # a bad line fails that document only, never the whole run
+                if doc_id in done:
+                    counts["skipped"] += 1
+                    continue
+                done.add(doc_id)
+                counts["error"] += 1
+                write({"id": doc_id, "error": f"line {lineno}: {type(e).__name__}: {e}"})
+                continue
+            if doc_id in done:
+                counts["skipped"] += 1
+                continue
+            done.add(doc_id)
+            await queue.put((doc_id, text))
+        for _ in workers:
+            await queue.put(None)
+        await asyncio.gather(*workers)
+    finally:
+        for w in workers:
+            w.cancel()
+    return counts
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Summarize documents from a JSONL file.")
+    parser.add_argument("input", nargs="?", default="-", help="input JSONL file, or - for stdin")
+    parser.add_argument("-o", "--output", required=True, help="output JSONL file (appended to)")
+    parser.add_argument("--concurrency", type=int, default=4, help="maximum in-flight requests")
+    parser.add_argument("--rps", type=float, default=0.0, help="maximum requests started per second (0 = unlimited)")
+    parser.add_argument("--timeout", type=float, default=120.0, help="per-document timeout in seconds")
+    parser.add_argument("--id-field", default="id")
+    parser.add_argument("--text-field", default="text")
+    parser.add_argument("--retry-errors", action="store_true", help="redo ids whose previous result was an error")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    trim_partial_line(args.output)
+    done = load_done_ids(args.output, retry_errors=args.retry_errors)
+    if done:
+        print(f"Resuming: {len(done)} ids already in {args.output}", file=sys.stderr)
+    chain = summary_prompt_template | build_llm(resolve_ollama_base())
+    source = sys.stdin if args.input == "-" else open(args.input, encoding="utf-8")
+    try:
+        with open(args.output, "a", encoding="utf-8") as out:
+            counts = asyncio.run(run_batch(
+                chain, source, out,
+                concurrency=args.concurrency,
+                rps=args.rps,
+                timeout=args.timeout,
+                id_field=args.id_field,
+                text_field=args.text_field,
+                done=done,
+            ))
+    finally:
+        if source is not sys.stdin:
+            source.close()
+    print(f"Batch finished: {counts}", file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,211 @@
+"""Benchmark the summary invoke path against an in-process fake Ollama server.
+
+Drives the real ``summary_prompt_template | llm`` chain through the same
+``timed`` + circuit breaker path ``main()`` uses, at fixed concurrency
+levels, and reports latency percentiles, throughput, error breakdown and
+breaker stats as JSON. Each scenario runs in its own subprocess so its
+``peak_rss_kb`` is its own. A micro-benchmark section measures our own
+per-call overhead (prompt rendering, ``timed``, ``CircuitBreaker.call``,
+client construction) in isolation.
+
+    python benchmark.py --concurrency 1 4 16 --requests 200 -o bench.json
+    python benchmark.py --scenario breaker_trip timeout
+"""
+import argparse
+import concurrent.futures
+import json
+import platform
+import resource
+import subprocess
+import sys
+import time
+
+from fake_ollama import FakeOllamaServer
+from main import make_invoke, summary_prompt_template
+from resilience import BreakerRegistry, CircuitBreakerError, deadline_stats, timed
+from router import make_ollama_llm
+
+SAMPLE_TEXT = (
+    "Ada Lovelace (10 December 1815 - 27 November 1852) was an English mathematician and writer, "
+    "chiefly known for her work on Charles Babbage's proposed mechanical general-purpose computer, "
+    "the Analytical Engine. She was the first to recognise that the machine had applications beyond "
+    "pure calculation.\n\n"
+    "Lovelace was the only legitimate child of poet Lord Byron and reformer Anne Isabella Milbanke. "
+    "She was privately schooled in mathematics and science by tutors including Augustus De Morgan.\n"
+) * 4
+
+# name -> (fake server settings, invoke timeout seconds)
+SCENARIOS = {
+    "baseline": ({"latency": 0.02, "jitter": 0.005, "tokens_per_second": 2000, "response_tokens": 64}, 5.0),
+    "slow_jittery": ({"latency": 0.15, "jitter": 0.1, "tokens_per_second": 500, "response_tokens": 64}, 5.0),
+    "breaker_trip": ({"latency": 0.01, "tokens_per_second": 0, "response_tokens": 16, "error_rate": 0.6}, 5.0),
+    "timeout": ({"latency": 0.5, "tokens_per_second": 0, "response_tokens": 16}, 0.2),
+}
+
+
+def peak_rss_kb() -> int:
+    usage = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KiB on Linux and bytes on macOS
+    return usage // 1024 if sys.platform == "darwin" else usage
+
+
+def percentile(sorted_values: list[float], q: float) -> float | None:
+    if not sorted_values:
+        return None
+    return sorted_values[min(len(sorted_values) - 1, int(q * len(sorted_values)))]
+
+
+def _micro(label: str, func, iterations: int) -> dict:
+    start = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    elapsed = time.perf_counter() - start
+    return {"name": label, "iterations": iterations, "us_per_op": round(elapsed / iterations * 1e6, 3)}
+
+
+def micro_benchmarks(iterations: int) -> list[dict]:
+    """Per-call overhead of the pieces main.py wraps around every model request."""
+    breaker = BreakerRegistry().get("micro")
+    timed_noop = timed(5.0)(lambda: None)
+    inputs = {"information": SAMPLE_TEXT}
+    return [
+        _micro("prompt_render", lambda: summary_prompt_template.invoke(inputs), iterations),
+        _micro("timed_noop", timed_noop, iterations),
+        _micro("breaker_call_noop", lambda: breaker.call(lambda: None), iterations),
+        _micro("client_construction", lambda: make_ollama_llm("http://127.0.0.1:1"), max(1, iterations // 10)),
+    ]
+
+
+def run_level(chain, invoke, concurrency: int, requests: int) -> dict:
+    latencies: list[float] = []
+    errors = {"timeout": 0, "breaker_open": 0, "other": 0}
+
+    def one(_):
+        start = time.perf_counter()
+        try:
+            invoke(chain, {"information": SAMPLE_TEXT})
+        except CircuitBreakerError:
+            return "breaker_open", time.perf_counter() - start
+        except TimeoutError:
+            return "timeout", time.perf_counter() - start
+        except Exception:
+            return "other", time.perf_counter() - start
+        return None, time.perf_counter() - start
+
+    wall_start = time.perf_counter()
+    with concurrent.futures.ThreadPoolExecutor(max_workers=concurrency) as ex:
+        for error, elapsed in ex.map(one, range(requests)):
+            if error:
+                errors[error] += 1
+            else:
+                latencies.append(elapsed)
+    wall = time.perf_counter() - wall_start
+    latencies.sort()
+    return {
+        "concurrency": concurrency,
+        "requests": requests,
+        "ok": len(latencies),
+        "errors": errors,
+        "wall_s": round(wall, 4),
+        "throughput_rps": round(len(latencies) / wall, 2) if wall else None,
+        "p50_ms": _ms(percentile(latencies, 0.50)),
+        "p95_ms": _ms(percentile(latencies, 0.95)),
+        "p99_ms": _ms(percentile(latencies, 0.99)),
+    }
+
+
+def _ms(value: float | None) -> float | None:
+    return None if value is None else round(value * 1000, 2)
+
+
+def run_scenario(name: str, concurrency_levels: list[int], requests: int, seed: int) -> dict:
+    server_options, timeout = SCENARIOS[name]
+    levels = []
+    with FakeOllamaServer(seed=seed, **server_options) as server:
+        llm = make_ollama_llm(server.url)
+        chain = summary_prompt_template | llm
+        for concurrency in concurrency_levels:
+            # a fresh breaker per level so one level's trips do not leak into the next
+            breaker = BreakerRegistry().get(f"bench:{name}:{concurrency}", failure_threshold=2,
+                                            recovery_timeout=0.5, window=10.0, slow_call_duration=timeout)
+            invoke = make_invoke(breaker, timeout=timeout, verbose=False)
+            result = run_level(chain, invoke, concurrency, requests)
+            result["breaker"] = breaker.stats()
+            result["breaker_mismatch"] = _breaker_mismatch(result)
+            levels.append(result)
+        server_requests = server.requests
+    return {
+        "scenario": name,
+        "server": server_options,
+        "timeout_s": timeout,
+        "server_requests": server_requests,
+        "levels": levels,
+        "deadline_executor": deadline_stats(),
+        "peak_rss_kb": peak_rss_kb(),
+    }
+
+
+def _breaker_mismatch(result: dict) -> list[str]:
+    """Where the breaker's own counts disagree with what callers saw (empty when consistent)."""
+    stats, errors = result["breaker"], result["errors"]
+    expected = {
+        "successes": result["ok"],
+        "failures": errors["timeout"] + errors["other"],
+        "rejected": errors["breaker_open"],
+    }
+    return [f"{key}: breaker {stats[key]}, observed {value}" for key, value in expected.items()
+            if stats[key] != value]
+
+
+def run_scenario_subprocess(name: str, concurrency_levels: list[int], requests: int, seed: int) -> dict:
+    """``run_scenario`` in a fresh interpreter, so RSS and thread pools are not shared between scenarios."""
+    argv = [sys.executable, __file__, "--scenario-worker", name, "--requests", str(requests),
+            "--seed", str(seed), "--concurrency", *map(str, concurrency_levels)]
+    proc = subprocess.run(argv, capture_output=True, text=True, check=True)
+    return json.loads(proc.stdout)
+
+
+def _git_revision() -> str | None:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the summary invoke path against a fake Ollama server.")
+    parser.add_argument("--scenario", nargs="+", choices=sorted(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=[1, 4, 16])
+    parser.add_argument("--requests", type=int, default=100, help="requests per concurrency level")
+    parser.add_argument("--micro-iterations", type=int, default=2000)
+    parser.add_argument("--seed", type=int, default=1234)
+    parser.add_argument("-o", "--output", help="write JSON here instead of stdout")
+    parser.add_argument("--scenario-worker", choices=sorted(SCENARIOS), help=argparse.SUPPRESS)
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.scenario_worker:
+        print(json.dumps(run_scenario(args.scenario_worker, args.concurrency, args.requests, args.seed)))
+        return
+    report = {
+        "revision": _git_revision(),
+        "python": platform.python_version(),
+        "started_at": time.time(),
+        "micro": micro_benchmarks(args.micro_iterations),
+        "micro_peak_rss_kb": peak_rss_kb(),
+        "scenarios": [run_scenario_subprocess(name, args.concurrency, args.requests, args.seed)
+                      for name in args.scenario],
+    }
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            f.write(text + "\n")
+    else:
+        print(text)
+
+
+if __name__ == "__main__":
+    main()
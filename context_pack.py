@@ -0,0 +1,118 @@
+"""Retrieval-based context packing for the summary prompt.
+
+Documents larger than the token budget are cut down to the paragraphs most
+relevant to the four output sections. Paragraphs are scored with BM25
+against one query per section and chosen round-robin across sections, so
+each section gets its best evidence before any section gets its second
+best. Paragraphs too large to pack are first split on sentence boundaries.
+The chosen passages are emitted in their original order, and the lead
+passage (which normally names the person) is always kept.
+"""
+import collections
+import math
+import re
+
+from summarize import CHARS_PER_TOKEN, _split_oversized, estimate_tokens, split_paragraphs
+
+# one keyword query per output section of summary_template
+SECTION_QUERIES = {
+    "Short Summary": "known regarded greatest famous career former international widely best",
+    "Two Interesting Facts": "first only youngest oldest record unusual nickname dubbed interested idolised",
+    "List of Achievements": "award won record century centuries trophy title honour ranked inducted highest most",
+    "Early Life and Career": "born early childhood family father mother brother school age young debut began",
+}
+
+_STOPWORDS = frozenset(
+    "a an and are as at be by for from had has have he her his in into is it its of on or she that the "
+    "their them they this to was were which who with".split()
+)
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+
+def tokenize(text: str) -> list[str]:
+    return [t for t in _TOKEN_RE.findall(text.lower()) if t not in _STOPWORDS]
+
+
+def estimate_prompt_tokens(prompt, input_dict: dict) -> int:
+    """Estimate the prompt size in tokens once ``input_dict`` is rendered into ``prompt``."""
+    return estimate_tokens(prompt.format(**input_dict))
+
+
+class BM25Index:
+    """Minimal Okapi BM25 over a list of passages."""
+
+    def __init__(self, passages: list[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self._docs = [collections.Counter(tokenize(p)) for p in passages]
+        self._lengths = [sum(d.values()) for d in self._docs]
+        self._avg_len = (sum(self._lengths) / len(self._lengths)) if self._lengths else 0.0
+        df: collections.Counter[str] = collections.Counter()
+        for doc in self._docs:
+            df.update(doc.keys())
+        n = len(self._docs)
+        self._idf = {term: math.log(1 + (n - freq + 0.5) / (freq + 0.5)) for term, freq in df.items()}
+
+    def scores(self, query: str) -> list[float]:
+        terms = tokenize(query)
+        out = []
+        for doc, length in zip(self._docs, self._lengths):
+            norm = self.k1 * (1 - self.b + self.b * length / self._avg_len) if self._avg_len else self.k1
+            score = 0.0
+            for term in terms:
+                tf = doc.get(term)
+                if tf:
+                    score += self._idf[term] * tf * (self.k1 + 1) / (tf + norm)
+            out.append(score)
+        return out
+
+    def rank(self, query: str) -> list[int]:
+        """Passage indices best-first for ``query``."""
+        scores = self.scores(query)
+        return sorted(range(len(scores)), key=lambda i: (-scores[i], i))
+
+
+def pack_context(text: str, budget_tokens: int, queries: dict[str, str] | None = None) -> str:
+    """Return ``text`` cut down to at most ``budget_tokens`` estimated tokens.
+
+    Text already within budget is returned unchanged. If no passage can be
+    selected the result is a budget-sized prefix of ``text``, never less.
+    """
+    if estimate_tokens(text) <= budget_tokens:
+        return text
+    if budget_tokens <= 0:
+        return ""
+    # pieces of at most a quarter of the budget (less the joining line), so no
+    # single paragraph crowds out the rest and four pieces fill it exactly
+    max_passage = max(1, budget_tokens // 4 - 1)
+    passages = []
+    for para in split_paragraphs(text):
+        if estimate_tokens(para) > max_passage:
+            passages.extend(_split_oversized(para, max_passage))
+        else:
+            passages.append(para)
+    if not passages:
+        return text[:budget_tokens * CHARS_PER_TOKEN]
+    index = BM25Index(passages)
+    rankings = [index.rank(query) for query in (queries or SECTION_QUERIES).values()]
+
+    lead_cost = estimate_tokens(passages[0])
+    chosen = {0} if lead_cost <= budget_tokens else set()
+    used = lead_cost if chosen else 0
+    exhausted = False
+    depth = 0
+    while not exhausted:
+        exhausted = True
+        for ranking in rankings:
+            if depth >= len(ranking):
+                continue
+            exhausted = False
+            i = ranking[depth]
+            cost = estimate_tokens(passages[i]) + 1
+            if i not in chosen and used + cost <= budget_tokens:
+                chosen.add(i)
+                used += cost
+        depth += 1
+    if not chosen:
+        return text[:budget_tokens * CHARS_PER_TOKEN]
+    return "\n\n".join(passages[i] for i in sorted(chosen))
@@ -0,0 +1,171 @@
+"""In-process fake Ollama HTTP server for benchmarks and local experiments.
+
+Implements just enough of the Ollama API for ``ChatOllama`` and discovery:
+``/api/chat`` (streaming and non-streaming), model preload via
+``/api/generate``, ``/api/tags``, ``/api/version`` and ``/v1/models``.
+Latency, jitter, token rate and error injection are configurable and can
+be changed while the server is running.
+
+    with FakeOllamaServer(latency=0.05, tokens_per_second=200) as server:
+        llm = make_ollama_llm(server.url)
+"""
+import http.server
+import json
+import random
+import threading
+import time
+from datetime import datetime, timezone
+
+
+class FakeOllamaServer:
+    """Threaded stub of an Ollama server.
+
+    Parameters:
+      latency: seconds before the first token (simulated prefill)
+      jitter: uniform +/- seconds added to ``latency``
+      tokens_per_second: generation rate; 0 sends the whole response at once
+      response_tokens: number of tokens ("word ") in each reply
+      error_rate: probability (0-1) that a chat request returns HTTP 500
+      model: model name reported by ``/api/tags``
+      seed: seed for the jitter/error RNG so runs are reproducible
+    """
+
+    def __init__(self, latency: float = 0.0, jitter: float = 0.0, tokens_per_second: float = 0.0,
+                 response_tokens: int = 64, error_rate: float = 0.0, model: str = "gemma3:latest",
+                 host: str = "127.0.0.1", port: int = 0, seed: int | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.tokens_per_second = tokens_per_second
+        self.response_tokens = response_tokens
+        self.error_rate = error_rate
+        self.model = model
+        self.requests = 0
+        self.errors = 0
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._httpd = http.server.ThreadingHTTPServer((host, port), self._handler())
+        self._httpd.daemon_threads = True
+        self._thread: threading.Thread | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._httpd.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "FakeOllamaServer":
+        self._thread = threading.Thread(target=self._httpd.serve_forever, name="fake-ollama", daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._httpd.shutdown()
+        self._httpd.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
+
+    def _plan(self) -> tuple[float, bool]:
+        """Return (delay before first token, whether to fail) for one request."""
+        with self._lock:
+            self.requests += 1
+            delay = max(0.0, self.latency + self._rng.uniform(-self.jitter, self.jitter))
+            fail = self._rng.random() < self.error_rate
+            if fail:
+                self.errors += 1
+        return delay, fail
+
+    def _handler(self):
+        server = self
+
+        class Handler(http.server.BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _send_json(self, status: int, payload):
+                body = json.dumps(payload).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def do_GET(self):
+                if self.path == "/api/version":
+                    self._send_json(200, {"version": "0.0.0-fake"})
+                elif self.path == "/api/tags":
+                    self._send_json(200, {"models": [{"name": server.model, "model": server.model}]})
+                elif self.path == "/v1/models":
+                    self._send_json(200, {"object": "list", "data": [{"id": server.model, "object": "model"}]})
+                elif self.path == "/":
+                    self._send_json(200, "Ollama is running")
+                else:
+                    self._send_json(404, {"error": "not found"})
+
+            def do_POST(self):
+                length = int(self.headers.get("Content-Length") or 0)
+                request = json.loads(self.rfile.read(length) or b"{}")
+                if self.path == "/api/generate" and not request.get("prompt"):
+                    # model preload/unload request (no prompt): nothing to generate
+                    self._send_json(200, {"model": request.get("model", server.model), "response": "", "done": True})
+                    return
+                if self.path != "/api/chat":
+                    self._send_json(404, {"error": "not found"})
+                    return
+                delay, fail = server._plan()
+                time.sleep(delay)
+                if fail:
+                    self._send_json(500, {"error": "injected failure"})
+                    return
+                prompt_tokens = sum(len(str(m.get("content", ""))) for m in request.get("messages", [])) // 4
+                if request.get("stream", True):
+                    self._stream(request, prompt_tokens, delay)
+                else:
+                    self._gen_wait()
+                    self._send_json(200, self._final(request, prompt_tokens, delay, "word " * server.response_tokens))
+
+            def _gen_wait(self):
+                if server.tokens_per_second > 0:
+                    time.sleep(server.response_tokens / server.tokens_per_second)
+
+            def _final(self, request, prompt_tokens, delay, content=""):
+                return {
+                    "model": request.get("model", server.model),
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                    "message": {"role": "assistant", "content": content},
+                    "done": True,
+                    "done_reason": "stop",
+                    "prompt_eval_count": prompt_tokens,
+                    "prompt_eval_duration": int(delay * 1e9),
+                    "eval_count": server.response_tokens,
+                    "eval_duration": int(server.response_tokens / server.tokens_per_second * 1e9)
+                    if server.tokens_per_second > 0 else 0,
+                }
+
+            def _stream(self, request, prompt_tokens, delay):
+                self.send_response(200)
+                self.send_header("Content-Type", "application/x-ndjson")
+                self.send_header("Transfer-Encoding", "chunked")
+                self.end_headers()
+                per_token = 1.0 / server.tokens_per_second if server.tokens_per_second > 0 else 0.0
+                for _ in range(server.response_tokens):
+                    if per_token:
+                        time.sleep(per_token)
+                    self._chunk({
+                        "model": request.get("model", server.model),
+                        "created_at": datetime.now(timezone.utc).isoformat(),
+                        "message": {"role": "assistant", "content": "word "},
+                        "done": False,
+                    })
+                self._chunk(self._final(request, prompt_tokens, delay))
+                self.wfile.write(b"0\r\n\r\n")
+
+            def _chunk(self, payload):
+                data = json.dumps(payload).encode() + b"\n"
+                self.wfile.write(f"{len(data):x}\r\n".encode() + data + b"\r\n")
+
+        return Handler
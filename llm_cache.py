@@ -0,0 +1,219 @@
+import collections
+import concurrent.futures
+import functools
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+
+from langchain_core.messages import BaseMessage, message_to_dict, messages_from_dict
+
+# generation params that change the model output and therefore belong in the key
+KEY_PARAMS = ("temperature", "num_ctx", "num_predict")
+
+
+def cache_key(rendered_prompt: str, model: str, params: dict) -> str:
+    payload = json.dumps([rendered_prompt, model, params], sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def chain_cache_key(chain, input_dict: dict) -> str | None:
+    """Build a cache key for a ``prompt | llm`` chain, or None if it is not one."""
+    prompt = getattr(chain, "first", None)
+    llm = getattr(chain, "last", None)
+    model = getattr(llm, "model", None) or getattr(llm, "model_name", None)
+    if prompt is None or model is None or len(getattr(chain, "middle", [])) > 0:
+        return None
+    rendered = prompt.invoke(input_dict).to_string()
+    params = {name: getattr(llm, name, None) for name in KEY_PARAMS}
+    return cache_key(rendered, model, params)
+
+
+def _dumps(value) -> str:
+    if isinstance(value, BaseMessage):
+        return json.dumps({"message": message_to_dict(value)})
+    return json.dumps({"value": value})
+
+
+def _loads(raw: str):
+    data = json.loads(raw)
+    if "message" in data:
+        return messages_from_dict([data["message"]])[0]
+    return data["value"]
+
+
+class LLMCache:
+    """Two-tier (in-memory LRU + SQLite) cache for deterministic LLM responses.
+
+    Parameters:
+      path: SQLite file for the disk tier, or None for memory only
+      max_memory_entries: LRU capacity of the in-memory tier
+      max_disk_bytes: approximate size cap of the disk tier; oldest-used rows are evicted
+      ttl: seconds an entry stays valid (None = forever)
+
+    Identical concurrent misses are coalesced: only the first caller runs the
+    backend call, the others wait for and share its result.
+    """
+
+    def __init__(self, path: str | None = None, max_memory_entries: int = 256,
+                 max_disk_bytes: int = 64 * 1024 * 1024, ttl: float | None = 7 * 24 * 3600):
+        self.max_memory_entries = max_memory_entries
+        self.max_disk_bytes = max_disk_bytes
+        self.ttl = ttl
+        self._memory: collections.OrderedDict[str, tuple[float, object]] = collections.OrderedDict()
+        self._inflight: dict[str, concurrent.futures.Future] = {}
+        self._lock = threading.Lock()
+        self._db_lock = threading.Lock()
+        self._db = None
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.coalesced = 0
+        if path:
+            self._db = sqlite3.connect(path, check_same_thread=False)
+            self._db.execute(
+                "CREATE TABLE IF NOT EXISTS llm_cache ("
+                " key TEXT PRIMARY KEY, value TEXT NOT NULL,"
+                " created REAL NOT NULL, accessed REAL NOT NULL, size INTEGER NOT NULL)"
+            )
+            self._db.execute("CREATE INDEX IF NOT EXISTS llm_cache_accessed ON llm_cache(accessed)")
+            self._db.commit()
+
+    def _expired(self, created: float, now: float) -> bool:
+        return self.ttl is not None and now - created > self.ttl
+
+    def _remember(self, key: str, created: float, value):
+        # caller holds self._lock
+        self._memory[key] = (created, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_memory_entries:
+            self._memory.popitem(last=False)
+
+    def _disk_get(self, key: str, now: float):
+        if self._db is None:
+            return None
+        with self._db_lock:
+            row = self._db.execute("SELECT value, created FROM llm_cache WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            if self._expired(row[1], now):
+                self._db.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                self._db.commit()
+                return None
+            self._db.execute("UPDATE llm_cache SET accessed = ? WHERE key = ?", (now, key))
+            self._db.commit()
+        return row[1], _loads(row[0])
+
+    def _disk_set(self, key: str, value, now: float):
+        if self._db is None:
+            return
+        raw = _dumps(value)
+        with self._db_lock:
+            self._db.execute(
+                "INSERT OR REPLACE INTO llm_cache (key, value, created, accessed, size) VALUES (?, ?, ?, ?, ?)",
+                (key, raw, now, now, len(raw)),
+            )
+            if self.ttl is not None:
+                self._db.execute("DELETE FROM llm_cache WHERE created < ?", (now - self.ttl,))
+            total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM llm_cache").fetchone()[0]
+            if total > self.max_disk_bytes:
+                # evict least recently used rows until we are back under the cap
+                excess = total - self.max_disk_bytes
+                freed = 0
+                victims = []
+                for vkey, size in self._db.execute("SELECT key, size FROM llm_cache ORDER BY accessed"):
+                    if freed >= excess:
+                        break
+                    victims.append((vkey,))
+                    freed += size
+                self._db.executemany("DELETE FROM llm_cache WHERE key = ?", victims)
+            self._db.commit()
+
+    def get(self, key: str):
+        """Return the cached value for ``key`` or None."""
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                if not self._expired(entry[0], now):
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return entry[1]
+                del self._memory[key]
+        entry = self._disk_get(key, now)
+        if entry is None:
+            return None
+        with self._lock:
+            self._remember(key, entry[0], entry[1])
+            self.hits += 1
+            self.disk_hits += 1
+        return entry[1]
+
+    def set(self, key: str, value):
+        now = time.time()
+        with self._lock:
+            self._remember(key, now, value)
+        self._disk_set(key, value, now)
+
+    def get_or_call(self, key: str, func, *args, **kwargs):
+        """Return the cached value for ``key``, calling ``func`` once on a miss."""
+        value = self.get(key)
+        if value is not None:
+            return value
+        with self._lock:
+            # a concurrent leader may have finished between get() and here
+            entry = self._memory.get(key)
+            if entry is not None and not self._expired(entry[0], time.time()):
+                self.hits += 1
+                return entry[1]
+            fut = self._inflight.get(key)
+            leader = fut is None
+            if leader:
+                fut = concurrent.futures.Future()
+                self._inflight[key] = fut
+                self.misses += 1
+            else:
+                self.coalesced += 1
+        if not leader:
+            return fut.result()
+        try:
+            value = func(*args, **kwargs)
+        except BaseException as e:
+            fut.set_exception(e)
+            raise
+        else:
+            self.set(key, value)
+            fut.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                self._inflight.pop(key, None)
+
+    def wrap(self, invoke):
+        """Wrap an ``invoke(chain, input_dict)`` callable with this cache."""
+
+        @functools.wraps(invoke)
+        def wrapper(chain, input_dict):
+            key = chain_cache_key(chain, input_dict)
+            if key is None:
+                return invoke(chain, input_dict)
+            return self.get_or_call(key, invoke, chain, input_dict)
+
+        return wrapper
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "coalesced": self.coalesced,
+                "memory_entries": len(self._memory),
+            }
+
+    def close(self):
+        if self._db is not None:
+            with self._db_lock:
+                self._db.close()
+                self._db = None
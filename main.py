@@ -1,156 +1,225 @@
 from itertools import chain
 import os
-from dotenv import load_dotenv
-import requests
 import time
-import threading
-import functools
-import concurrent.futures
+from dotenv import load_dotenv
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
-from langchain_ollama import ChatOllama
-import os
-
+from summarize import estimate_tokens, map_reduce_summarize
+from context_pack import estimate_prompt_tokens, pack_context
+from llm_cache import LLMCache
+from ollama_discovery import discover_ollama
+from router import DEFAULT_OLLAMA_MODEL, OLLAMA_NUM_CTX, OLLAMA_NUM_PREDICT, make_ollama_llm, router_from_env
+from resilience import BreakerRegistry, CircuitBreakerError, timed
+import telemetry
+
+_dotenv_start = time.perf_counter()
 load_dotenv()
+_DOTENV_SECONDS = time.perf_counter() - _dotenv_start
 
 
-# --- Resilience helpers: simple circuit breaker + timeout decorator ---
-class CircuitBreakerError(RuntimeError):
-    pass
+# circuit breakers are kept per endpoint/model so one bad host does not block the others
+BREAKERS = BreakerRegistry(recovery_timeout=30.0, window=60.0, half_open_max_calls=1, expected_exception=Exception)
 
 
-class CircuitBreaker:
-    """A very small in-process circuit breaker.
+def _on_breaker_change(breaker, old, new):
+    print(f"Circuit {breaker.name}: {old} -> {new}")
 
-    Parameters:
-      failure_threshold: number of consecutive failures to open the circuit
-      recovery_timeout: seconds to wait before attempting a half-open trial
-      expected_exception: exception or tuple of exceptions that count as failures
-    """
 
-    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 30.0, expected_exception=Exception):
-        self.failure_threshold = failure_threshold
-        self.recovery_timeout = recovery_timeout
-        self.expected_exception = expected_exception
-        self._failure_count = 0
-        self._state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
-        self._opened_since = None
-        self._lock = threading.Lock()
-
-    def _open(self):
-        self._state = "OPEN"
-        self._opened_since = time.monotonic()
-
-    def _close(self):
-        self._state = "CLOSED"
-        self._failure_count = 0
-        self._opened_since = None
-
-    def _maybe_transition(self):
-        if self._state == "OPEN" and self._opened_since is not None:
-            if time.monotonic() - self._opened_since >= self.recovery_timeout:
-                self._state = "HALF_OPEN"
-
-    def call(self, func, *args, **kwargs):
-        with self._lock:
-            self._maybe_transition()
-            if self._state == "OPEN":
-                raise CircuitBreakerError("Circuit is open; skipping call")
-
-        try:
-            result = func(*args, **kwargs)
-        except self.expected_exception as e:
-            with self._lock:
-                self._failure_count += 1
-                if self._failure_count >= self.failure_threshold:
-                    self._open()
-            raise
-        else:
-            with self._lock:
-                # on success, if half-open then close; reset failure count
-                if self._state in ("HALF_OPEN", "OPEN"):
-                    self._close()
-                else:
-                    self._failure_count = 0
-            return result
+BREAKERS.add_listener(_on_breaker_change)
+BREAKERS.add_listener(telemetry.on_breaker_change)
 
-    def __call__(self, func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            return self.call(func, *args, **kwargs)
 
-        return wrapper
+def discover_local_ollama(port: int = 11434, timeout: float = 0.3) -> dict:
+    """Discover a local Ollama server and its models, guarded by a per-port circuit breaker.
 
+    Returns ``{"base": url_or_None, "models": [...], "checked": unix_time}``.
+    """
+    breaker = BREAKERS.get(f"ollama-discovery:localhost:{port}", failure_threshold=3, recovery_timeout=20.0)
+    with telemetry.span("discovery", port=port):
+        return breaker.call(_discover_local_ollama, port, timeout)
 
-def timed(timeout: float):
-    """Decorator to run a function in a thread and raise TimeoutError on timeout."""
-
-    def deco(func):
-        @functools.wraps(func)
-        def wrapper(*args, **kwargs):
-            with concurrent.futures.ThreadPoolExecutor(max_workers=1) as ex:
-                fut = ex.submit(func, *args, **kwargs)
-                try:
-                    return fut.result(timeout=timeout)
-                except concurrent.futures.TimeoutError as e:
-                    # cancel is best-effort; underlying thread may continue until completion
-                    fut.cancel()
-                    raise TimeoutError(f"Function call timed out after {timeout} seconds") from e
 
-        return wrapper
+def detect_local_ollama(port: int = 11434, timeout: float = 0.3) -> str | None:
+    """Try to detect a local Ollama HTTP server.
 
-    return deco
+    Returns the base URL if found (e.g. 'http://localhost:11434'), otherwise None.
+    """
+    return discover_local_ollama(port, timeout)["base"]
 
 
-# configure a circuit breaker for local-ollama checks and LLM invokes
-_OLLAMA_CB = CircuitBreaker(failure_threshold=3, recovery_timeout=20.0, expected_exception=Exception)
-_LLM_CB = CircuitBreaker(failure_threshold=2, recovery_timeout=30.0, expected_exception=Exception)
+@timed(2.0)
+def _discover_local_ollama(port: int = 11434, timeout: float = 0.3) -> dict:
+    return discover_ollama(
+        ports=(port,),
+        timeout=timeout,
+        cache_path=os.getenv("OLLAMA_DISCOVERY_CACHE", ".ollama_discovery.json") or None,
+        refresh=os.getenv("OLLAMA_DISCOVERY_REFRESH") == "1",
+    )
 
 
-@_OLLAMA_CB
-@timed(2.0)
-def detect_local_ollama(port: int = 11434, timeout: float = 1.5) -> str | None:
-    """Try to detect a local Ollama HTTP server.
+# {information} appears exactly once so the document is only prefilled once
+summary_template = """
+You are given biographical text about a single person.
 
-    Returns the base URL if found (e.g. 'http://localhost:11434'), otherwise None.
-    The function will try a couple of likely endpoints and return as soon as one responds.
-    """
-    host = "http://localhost"
-    base = f"{host}:{port}"
-    candidates = ["/v1/models", "/ping", "/"]
-    for path in candidates:
-        try:
-            url = base + path
-            resp = requests.get(url, timeout=timeout)
-            # any 2xx/3xx/4xx response means something is listening there
-            if resp.status_code >= 200:
-                return base
-        except requests.RequestException:
-            continue
-    return None
- 
+STRICT INSTRUCTIONS:
+- Use ONLY the information in the TEXT below. Do NOT use prior knowledge.
+- If a detail is not present in the TEXT, say "Not specified".
+- Keep the person consistent with the TEXT. Do NOT switch to anyone else.
+- Output four sections exactly in this order:
+  1. Short Summary
+  2. Two Interesting Facts
+  3. List of Achievements
+  4. Early Life and Career (brief)
 
+TEXT:
+{information}
 
+Now write the four sections.
+"""
+summary_prompt_template = PromptTemplate(
+    input_variables=["information"],
+    template=summary_template,
+)
 
-def main():
-    print("Hello from langchain-learning!")
-    print(f"API Key: {os.getenv('OPENAI_API_KEY')}")
 
-    # Determine Ollama base URL: prefer explicit env var, otherwise try localhost detection
+def resolve_ollama_base() -> str | None:
+    """Return the Ollama base URL from the environment or local detection, else None."""
     ollama_env = os.getenv("OLLAMA_URL") or os.getenv("OLLAMA_HOST")
     if ollama_env:
         print(f"Using Ollama base URL from environment: {ollama_env}")
         ollama_base = ollama_env
     else:
-        detected = detect_local_ollama()
-        if detected:
-            ollama_base = detected
+        discovered = discover_local_ollama()
+        if discovered["base"]:
+            ollama_base = discovered["base"]
             # export for libraries that read env vars
             os.environ.setdefault("OLLAMA_URL", ollama_base)
             print(f"Detected local Ollama at {ollama_base}; set OLLAMA_URL environment variable.")
+            if discovered["models"]:
+                print(f"Models available at {ollama_base}: {', '.join(discovered['models'])}")
         else:
             ollama_base = None
             print("No local Ollama detected (tried http://localhost:11434). If you run Ollama locally, set OLLAMA_URL env var to point at it.")
+    return ollama_base
+
+
+def build_llm(ollama_base: str | None):
+    """Construct the chat model used for summaries.
+
+    With more than one backend configured (``OLLAMA_URLS`` plus optional
+    ``OPENAI_FALLBACK_URLS``) this is a latency-aware router across them;
+    otherwise a single ChatOllama client.
+    """
+    routed = router_from_env(breakers=BREAKERS, failure_threshold=2, slow_call_duration=15.0,
+                             slow_call_rate_threshold=0.5)
+    if routed is not None:
+        return routed
+    return make_ollama_llm(ollama_base, os.getenv("OLLAMA_MODEL", DEFAULT_OLLAMA_MODEL))
+
+
+def llm_breaker(ollama_base: str | None, llm):
+    """Circuit breaker for model calls to ``llm`` at ``ollama_base``."""
+    return BREAKERS.get(
+        f"llm:{ollama_base or 'default'}:{llm.model}",
+        failure_threshold=2,
+        slow_call_duration=15.0,
+        slow_call_rate_threshold=0.5,
+    )
+
+
+def make_invoke(breaker, timeout: float = 20.0, verbose: bool = True):
+    """Return the ``_invoke(chain, input_dict)`` call path: circuit breaker around a deadline.
+
+    The breaker wraps the deadline (not the other way round) so a call that
+    times out is recorded as a failure at once, even if the backend never answers.
+    """
+
+    @timed(timeout)
+    def _call(prompt, input_dict):
+        if verbose:
+            print("Invoking LLM...")
+        # time prompt rendering separately from the model call for plain ``prompt | llm`` chains
+        first, last = getattr(prompt, "first", None), getattr(prompt, "last", None)
+        if first is not None and last is not None and not getattr(prompt, "middle", None):
+            with telemetry.span("prompt_render"):
+                prompt_value = first.invoke(input_dict)
+            with telemetry.span("model_invoke", breaker=breaker.name):
+                result = last.invoke(prompt_value)
+        else:
+            with telemetry.span("model_invoke", breaker=breaker.name):
+                result = prompt.invoke(input=input_dict)
+        telemetry.record_usage(result, breaker=breaker.name)
+        return result
+
+    def _invoke(prompt, input_dict):
+        with telemetry.span("invoke"):
+            try:
+                result = breaker.call(_call, prompt, input_dict)
+            except CircuitBreakerError:
+                telemetry.inc("summarizer_breaker_rejections_total", breaker=breaker.name)
+                telemetry.inc("summarizer_llm_calls_total", outcome="rejected")
+                raise
+            except TimeoutError:
+                telemetry.inc("summarizer_llm_timeouts_total", breaker=breaker.name)
+                telemetry.inc("summarizer_llm_calls_total", outcome="timeout")
+                raise
+            except Exception:
+                telemetry.inc("summarizer_llm_calls_total", outcome="error")
+                raise
+            telemetry.inc("summarizer_llm_calls_total", outcome="ok")
+            return result
+
+    return _invoke
+
+
+def make_cache() -> LLMCache | None:
+    """Response cache configured from the environment, or None when disabled."""
+    # temperature=0 makes responses deterministic, so repeat prompts can be served from cache
+    if os.getenv("LLM_CACHE", "1") == "0":
+        return None
+    return LLMCache(
+        path=os.getenv("LLM_CACHE_PATH", ".llm_cache.sqlite3"),
+        ttl=float(os.getenv("LLM_CACHE_TTL", str(7 * 24 * 3600))),
+    )
+
+
+def summarize_text(information: str, llm, invoke):
+    """Summarize ``information`` through ``invoke``.
+
+    Documents within the context budget go to the summary prompt in one call;
+    those up to ``SUMMARY_PACK_MAX_RATIO`` times the budget are packed down to
+    it first; anything larger takes the map-reduce path.
+    """
+    # keep the document (plus template and reply) inside the model's context window
+    window_budget = (OLLAMA_NUM_CTX - OLLAMA_NUM_PREDICT
+                     - estimate_prompt_tokens(summary_prompt_template, {"information": ""}) - 256)
+    context_budget = min(int(os.getenv("SUMMARY_CONTEXT_TOKENS", "6144")), window_budget)
+
+    def pack(text: str) -> str:
+        with telemetry.span("context_pack"):
+            return pack_context(text, context_budget)
+
+    with telemetry.span("summarize"):
+        if estimate_tokens(information) <= context_budget * float(os.getenv("SUMMARY_PACK_MAX_RATIO", "2")):
+            return invoke(summary_prompt_template | llm, {"information": pack(information)})
+        # too large to pack without losing most of it: map every chunk, pack only the reduce input
+        return map_reduce_summarize(
+            information,
+            summary_prompt_template,
+            llm,
+            invoke,
+            max_chunk_tokens=int(os.getenv("SUMMARY_CHUNK_TOKENS", "2048")),
+            max_workers=int(os.getenv("SUMMARY_MAP_WORKERS", "4")),
+            pack=pack,
+        )
+
+
+def main():
+    telemetry.configure_from_env()
+    telemetry.observe("summarizer_stage_seconds", _DOTENV_SECONDS, stage="dotenv")
+    print("Hello from langchain-learning!")
+    print(f"API Key: {os.getenv('OPENAI_API_KEY')}")
+
+    ollama_base = resolve_ollama_base()
     information = """
 Sachin Ramesh Tendulkar (/ˌsʌtʃɪn tɛnˈduːlkər/ ⓘ; Marathi: [sətɕin t̪eɳɖulkəɾ]; born 24 April 1973) is an Indian former international cricketer who captained the Indian national team. Often dubbed the "God of Cricket" in India, he is widely regarded as one of the greatest cricketers of all time as well as one of the greatest batsmen of all time.[5] He holds several world records, including being the all-time highest run-scorer in cricket,[6] receiving the most player of the match awards in international cricket,[7] and being the only batsman to score 100 international centuries.[8] Tendulkar was a Member of Parliament, Rajya Sabha by presidential nomination from 2012 to 2018.[9][10]
 
@@ -208,67 +277,15 @@ Rise through the ranks
 1994–96: ODI matches
 Tendulkar opened the batting for the first time in ODIs at Auckland against New Zealand in 1994, scoring an explosive 82 runs off just 49 balls.[83] This was an innings hailed by Wisden as one that “changed ODI cricket forever.”[84] He scored his first ODI century on 9 September 1994 against Australia in Sri Lanka at Colombo, in his 79th ODI.[85][86][87]
     """
-    summary_template = """
-    You are given biographical text about a single person.
+    with telemetry.span("client_construction"):
+        llm = build_llm(ollama_base)
 
-STRICT INSTRUCTIONS:
-- Use ONLY the information in {information}. Do NOT use prior knowledge.
-- If a detail is not present in {information}, say "Not specified".
-- Keep the person consistent with {information}. Do NOT switch to anyone else.
-- Output four sections exactly in this order:
-  1. Short Summary
-  2. Two Interesting Facts
-  3. List of Achievements
-  4. Early Life and Career (brief)
-
-Now write the four sections.
-    """
-    summary_prompt_template = PromptTemplate(
-        input_variables=["information"],
-        template=summary_template,
-    )
-    #llm = ChatOpenAI(temperature=0,model="gpt-4o-mini")
-    # Try to pass the detected base url to ChatOllama if the client supports it.
-    if ollama_base:
-        try:
-            llm = ChatOllama(temperature=0, model="gemma3:latest", base_url=ollama_base,num_ctx=16834, model_kwargs={
-        "gpu_layers": 16,          # how many transformer layers on GPU
-        "num_ctx": 16384,          # 8k–32k is a good default
-        "num_thread": os.cpu_count(),
-        "num_predict": 512,
-        "keep_alive": "30m",
-        "num_gpu": 1               # optional; single-GPU box
-    })
-        except TypeError:
-            # Some versions of the client may not accept base_url param; rely on OLLAMA_URL env var instead
-            llm = ChatOllama(temperature=0, model="gemma3:latest",num_ctx=16834, model_kwargs={
-        "gpu_layers": 16,          # how many transformer layers on GPU
-        "num_ctx": 16384,          # 8k–32k is a good default
-        "num_thread": os.cpu_count(),
-        "num_predict": 512,
-        "keep_alive": "30m",
-        "num_gpu": 1               # optional; single-GPU box
-    })
-    else:
-        llm = ChatOllama(temperature=0, model="gemma3:latest",num_ctx=16834, model_kwargs={
-        "gpu_layers": 16,          # how many transformer layers on GPU
-        "num_ctx": 16384,          # 8k–32k is a good default
-        "num_thread": os.cpu_count(),
-        "num_predict": 512,
-        "keep_alive": "30m",
-        "num_gpu": 1               # optional; single-GPU box
-    })
-
-    llm_prompt = summary_prompt_template | llm
-
-    @timed(20.0)
-    @_LLM_CB
-    def _invoke(prompt, input_dict):
-        print("Invoking LLM...")
-        return prompt.invoke(input=input_dict)
+    _invoke = make_invoke(llm_breaker(ollama_base, llm))
+    cache = make_cache()
+    invoke = cache.wrap(_invoke) if cache is not None else _invoke
 
     try:
-        summary = _invoke(llm_prompt, {"information": information})
+        summary = summarize_text(information, llm, invoke)
     except CircuitBreakerError as e:
         summary = f"LLM circuit open or prevented call: {e}"
     except TimeoutError as e:
@@ -276,6 +293,10 @@ Now write the four sections.
     except Exception as e:
         summary = f"LLM invocation failed: {e}"
     print("Summary:")
-    print(summary.content)
+    print(getattr(summary, "content", summary))
+    if cache is not None:
+        print(f"LLM cache: {cache.stats()}")
+        cache.close()
+    telemetry.flush()
 if __name__ == "__main__":
     main()
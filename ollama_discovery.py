@@ -0,0 +1,128 @@
+import concurrent.futures
+import json
+import os
+import time
+
+import requests
+from requests.adapters import HTTPAdapter
+
+DEFAULT_HOSTS = ("localhost", "127.0.0.1")
+DEFAULT_PORTS = (11434,)
+# /api/version is the cheapest Ollama endpoint; the others cover proxies and OpenAI-compatible shims
+DEFAULT_PATHS = ("/api/version", "/v1/models", "/")
+
+_SESSION: requests.Session | None = None
+_PROBE_POOL: concurrent.futures.ThreadPoolExecutor | None = None
+
+
+def get_session() -> requests.Session:
+    """Shared ``requests.Session`` so repeated calls reuse pooled keep-alive connections."""
+    global _SESSION
+    if _SESSION is None:
+        session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=8, pool_maxsize=32)
+        session.mount("http://", adapter)
+        session.mount("https://", adapter)
+        _SESSION = session
+    return _SESSION
+
+
+def _probe_pool() -> concurrent.futures.ThreadPoolExecutor:
+    global _PROBE_POOL
+    if _PROBE_POOL is None:
+        _PROBE_POOL = concurrent.futures.ThreadPoolExecutor(max_workers=8, thread_name_prefix="ollama-probe")
+    return _PROBE_POOL
+
+
+def _probe(base: str, path: str, timeout: float) -> str | None:
+    try:
+        resp = get_session().get(base + path, timeout=timeout)
+    except requests.RequestException:
+        return None
+    # any 2xx/3xx/4xx response means something is listening there
+    return base if resp.status_code < 500 else None
+
+
+def list_models(base: str, timeout: float = 1.0) -> list[str]:
+    """Return model names served at ``base`` (Ollama ``/api/tags``, else ``/v1/models``)."""
+    session = get_session()
+    try:
+        resp = session.get(f"{base}/api/tags", timeout=timeout)
+        if resp.ok:
+            return [m["name"] for m in resp.json().get("models", [])]
+        resp = session.get(f"{base}/v1/models", timeout=timeout)
+        if resp.ok:
+            return [m["id"] for m in resp.json().get("data", [])]
+    except (requests.RequestException, ValueError, KeyError, TypeError):
+        pass
+    return []
+
+
+def _read_cache(path: str, probed: dict, ttl: float, negative_ttl: float) -> dict | None:
+    try:
+        with open(path, encoding="utf-8") as f:
+            entry = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if not isinstance(entry, dict) or entry.get("probed") != probed:
+        return None  # written for a different set of candidates
+    age = time.time() - entry.get("checked", 0)
+    if age > (ttl if entry.get("base") else negative_ttl):
+        return None
+    return entry
+
+
+def _write_cache(path: str, entry: dict):
+    tmp = f"{path}.tmp"
+    try:
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(entry, f)
+        os.replace(tmp, path)
+    except OSError:
+        pass  # the cache is an optimisation only
+
+
+def discover_ollama(
+    hosts=DEFAULT_HOSTS,
+    ports=DEFAULT_PORTS,
+    paths=DEFAULT_PATHS,
+    timeout: float = 0.3,
+    cache_path: str | None = ".ollama_discovery.json",
+    ttl: float = 300.0,
+    negative_ttl: float = 30.0,
+    refresh: bool = False,
+) -> dict:
+    """Find a reachable Ollama server by probing every host/port/path in parallel.
+
+    Returns ``{"base": url_or_None, "models": [...], "checked": unix_time,
+    "probed": {"hosts": [...], "ports": [...], "paths": [...]}}``.
+    The first responding candidate wins and the remaining probes are
+    abandoned. Results (including "nothing found", for ``negative_ttl``
+    seconds) are cached in ``cache_path`` so later process starts skip
+    probing; an entry written for different candidates is ignored.
+    """
+    probed = {"hosts": list(hosts), "ports": list(ports), "paths": list(paths)}
+    if cache_path and not refresh:
+        entry = _read_cache(cache_path, probed, ttl, negative_ttl)
+        if entry is not None:
+            return entry
+
+    bases = [f"http://{host}:{port}" for host in hosts for port in ports]
+    pool = _probe_pool()
+    futures = [pool.submit(_probe, base, path, timeout) for base in bases for path in paths]
+    found = None
+    try:
+        for fut in concurrent.futures.as_completed(futures, timeout=timeout * 2 + 0.5):
+            found = fut.result()
+            if found:
+                break
+    except concurrent.futures.TimeoutError:
+        pass
+    for fut in futures:
+        fut.cancel()
+
+    entry = {"base": found, "models": list_models(found, timeout=max(timeout, 1.0)) if found else [],
+             "checked": time.time(), "probed": probed}
+    if cache_path:
+        _write_cache(cache_path, entry)
+    return entry
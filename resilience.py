@@ -0,0 +1,512 @@
+import asyncio
+import concurrent.futures
+import contextvars
+import functools
+import inspect
+import os
+import queue
+import threading
+import time
+
+# --- Resilience helpers: circuit breakers + timeout decorator ---
+class CircuitBreakerError(RuntimeError):
+    pass
+
+
+class _Bucket:
+    __slots__ = ("epoch", "calls", "failures", "slow", "lock", "total_calls", "total_failures", "total_slow")
+
+    def __init__(self):
+        self.epoch = -1
+        self.calls = 0
+        self.failures = 0
+        self.slow = 0
+        self.lock = threading.Lock()
+        # lifetime totals survive bucket rotation; summed for stats()
+        self.total_calls = 0
+        self.total_failures = 0
+        self.total_slow = 0
+
+
+class CircuitBreaker:
+    """In-process circuit breaker over a time-bucketed sliding window.
+
+    The circuit opens when, within the last ``window`` seconds, at least
+    ``minimum_calls`` calls were made and either the failure rate or the
+    slow-call rate crosses its threshold. After ``recovery_timeout`` it goes
+    HALF_OPEN and admits at most ``half_open_max_calls`` probe calls; if they
+    all succeed it closes, and any failed or slow probe re-opens it.
+
+    Parameters:
+      failure_threshold: minimum failures in the window before it may open
+      recovery_timeout: seconds to wait before attempting a half-open trial
+      expected_exception: exception or tuple of exceptions that count as failures
+      window: sliding window length in seconds
+      buckets: number of time buckets the window is divided into
+      failure_rate_threshold: failure fraction (0-1) that opens the circuit
+      slow_call_duration: calls slower than this many seconds count as slow (None disables)
+      slow_call_rate_threshold: slow-call fraction (0-1) that opens the circuit
+      minimum_calls: calls needed in the window before rates are evaluated
+      half_open_max_calls: concurrent probe calls admitted while HALF_OPEN
+      on_state_change: callable ``(breaker, old_state, new_state)`` invoked on transitions
+      name: label used in errors and stats
+
+    Recording a result only takes the lock of the current time bucket; the
+    breaker-wide state lock is used for transitions and half-open probes.
+    """
+
+    def __init__(self, failure_threshold: int = 3, recovery_timeout: float = 30.0, expected_exception=Exception,
+                 window: float = 60.0, buckets: int = 10, failure_rate_threshold: float = 0.5,
+                 slow_call_duration: float | None = None, slow_call_rate_threshold: float = 1.0,
+                 minimum_calls: int | None = None, half_open_max_calls: int = 1,
+                 on_state_change=None, name: str = ""):
+        self.failure_threshold = failure_threshold
+        self.recovery_timeout = recovery_timeout
+        self.expected_exception = expected_exception
+        self.window = window
+        self.failure_rate_threshold = failure_rate_threshold
+        self.slow_call_duration = slow_call_duration
+        self.slow_call_rate_threshold = slow_call_rate_threshold
+        self.minimum_calls = failure_threshold if minimum_calls is None else minimum_calls
+        self.half_open_max_calls = half_open_max_calls
+        self.name = name
+        self._listeners = [on_state_change] if on_state_change else []
+        self._bucket_width = window / buckets
+        self._buckets = [_Bucket() for _ in range(buckets)]
+        self._state = "CLOSED"  # CLOSED, OPEN, HALF_OPEN
+        self._opened_since = None
+        self._probes_in_flight = 0
+        self._probe_successes = 0
+        self._lock = threading.Lock()
+        self.counters = {"rejected": 0, "opened": 0, "half_opened": 0, "closed": 0}
+
+    @property
+    def state(self) -> str:
+        return self._state
+
+    @property
+    def effective_state(self) -> str:
+        """State the next call would see: OPEN reads as HALF_OPEN once ``recovery_timeout`` has passed."""
+        if self._state == "OPEN" and time.monotonic() - self._opened_since >= self.recovery_timeout:
+            return "HALF_OPEN"
+        return self._state
+
+    def add_listener(self, callback):
+        """Register ``callback(breaker, old_state, new_state)`` for state changes."""
+        self._listeners.append(callback)
+
+    # -- sliding window -------------------------------------------------
+    def _record(self, failed: bool, slow: bool, now: float):
+        epoch = int(now / self._bucket_width)
+        bucket = self._buckets[epoch % len(self._buckets)]
+        with bucket.lock:
+            if bucket.epoch != epoch:
+                bucket.epoch = epoch
+                bucket.calls = bucket.failures = bucket.slow = 0
+            bucket.calls += 1
+            bucket.failures += failed
+            bucket.slow += slow
+            bucket.total_calls += 1
+            bucket.total_failures += failed
+            bucket.total_slow += slow
+
+    def window_totals(self, now: float | None = None) -> tuple[int, int, int]:
+        """Return ``(calls, failures, slow_calls)`` recorded in the current window."""
+        now = time.monotonic() if now is None else now
+        oldest = int(now / self._bucket_width) - len(self._buckets)
+        calls = failures = slow = 0
+        for b in self._buckets:
+            if b.epoch > oldest:
+                calls += b.calls
+                failures += b.failures
+                slow += b.slow
+        return calls, failures, slow
+
+    def _should_open(self, now: float) -> bool:
+        calls, failures, slow = self.window_totals(now)
+        if calls < self.minimum_calls:
+            return False
+        if failures >= self.failure_threshold and failures / calls >= self.failure_rate_threshold:
+            return True
+        return self.slow_call_duration is not None and slow / calls >= self.slow_call_rate_threshold
+
+    # -- state machine --------------------------------------------------
+    def _transition(self, new_state: str, now: float):
+        # caller holds self._lock; returns the old state for notification
+        old = self._state
+        self._state = new_state
+        if new_state == "OPEN":
+            self._opened_since = now
+            self.counters["opened"] += 1
+        elif new_state == "HALF_OPEN":
+            self._probes_in_flight = 0
+            self._probe_successes = 0
+            self.counters["half_opened"] += 1
+        else:
+            self._opened_since = None
+            for b in self._buckets:
+                with b.lock:
+                    b.epoch = -1
+                    b.calls = b.failures = b.slow = 0
+            self.counters["closed"] += 1
+        return old
+
+    def _notify(self, old: str, new: str):
+        for callback in self._listeners:
+            try:
+                callback(self, old, new)
+            except Exception:
+                pass
+
+    def _admit(self) -> bool:
+        """Return True if the call is a half-open probe; raise if it is rejected."""
+        if self._state == "CLOSED":
+            return False
+        changed = None
+        with self._lock:
+            now = time.monotonic()
+            if self._state == "OPEN" and now - self._opened_since >= self.recovery_timeout:
+                changed = (self._transition("HALF_OPEN", now), "HALF_OPEN")
+            state = self._state
+            if state == "HALF_OPEN" and self._probes_in_flight < self.half_open_max_calls:
+                self._probes_in_flight += 1
+                probe = True
+            elif state == "CLOSED":
+                probe = False
+            else:
+                self.counters["rejected"] += 1
+                probe = None
+        if changed:
+            self._notify(*changed)
+        if probe is None:
+            label = f" {self.name}" if self.name else ""
+            raise CircuitBreakerError(f"Circuit{label} is {state.lower().replace('_', '-')}; skipping call")
+        return probe
+
+    def _on_result(self, probe: bool, failed: bool, elapsed: float):
+        now = time.monotonic()
+        slow = self.slow_call_duration is not None and elapsed >= self.slow_call_duration
+        self._record(failed, slow, now)
+        if not probe and not failed and not slow:
+            return  # fast path: healthy call while closed
+        changed = None
+        with self._lock:
+            if probe and self._state == "HALF_OPEN":
+                self._probes_in_flight -= 1
+                if failed or slow:
+                    changed = (self._transition("OPEN", now), "OPEN")
+                else:
+                    self._probe_successes += 1
+                    if self._probe_successes >= self.half_open_max_calls:
+                        changed = (self._transition("CLOSED", now), "CLOSED")
+            elif self._state == "CLOSED" and self._should_open(now):
+                changed = (self._transition("OPEN", now), "OPEN")
+        if changed:
+            self._notify(*changed)
+
+    def call(self, func, *args, **kwargs):
+        probe = self._admit()
+        start = time.monotonic()
+        try:
+            result = func(*args, **kwargs)
+        except self.expected_exception:
+            self._on_result(probe, True, time.monotonic() - start)
+            raise
+        except BaseException:
+            # not a backend failure (e.g. KeyboardInterrupt); free the probe slot
+            if probe:
+                with self._lock:
+                    self._probes_in_flight -= 1
+            raise
+        self._on_result(probe, False, time.monotonic() - start)
+        return result
+
+    async def acall(self, func, *args, **kwargs):
+        """Like ``call`` for a coroutine function."""
+        probe = self._admit()
+        start = time.monotonic()
+        try:
+            result = await func(*args, **kwargs)
+        except self.expected_exception:
+            self._on_result(probe, True, time.monotonic() - start)
+            raise
+        except BaseException:
+            if probe:
+                with self._lock:
+                    self._probes_in_flight -= 1
+            raise
+        self._on_result(probe, False, time.monotonic() - start)
+        return result
+
+    def __call__(self, func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                return await self.acall(func, *args, **kwargs)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            return self.call(func, *args, **kwargs)
+
+        return wrapper
+
+    def stats(self) -> dict:
+        calls, failures, slow = self.window_totals()
+        total_calls = sum(b.total_calls for b in self._buckets)
+        total_failures = sum(b.total_failures for b in self._buckets)
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            "name": self.name,
+            "state": self._state,
+            "window_calls": calls,
+            "window_failures": failures,
+            "window_slow_calls": slow,
+            "calls": total_calls,
+            "successes": total_calls - total_failures,
+            "failures": total_failures,
+            "slow_calls": sum(b.total_slow for b in self._buckets),
+            **counters,
+        }
+
+
+class BreakerRegistry:
+    """Lazily created circuit breakers keyed by endpoint/model.
+
+    ``get`` is a plain dict lookup once a breaker exists; the registry lock is
+    only taken to create a new one. ``defaults`` are passed to every new
+    ``CircuitBreaker`` and can be overridden per key.
+    """
+
+    def __init__(self, on_state_change=None, **defaults):
+        self.defaults = defaults
+        self._on_state_change = on_state_change
+        self._breakers: dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+    def get(self, key: str, **overrides) -> CircuitBreaker:
+        breaker = self._breakers.get(key)
+        if breaker is not None:
+            return breaker
+        with self._lock:
+            breaker = self._breakers.get(key)
+            if breaker is None:
+                options = {**self.defaults, **overrides}
+                breaker = CircuitBreaker(name=key, on_state_change=self._on_state_change, **options)
+                self._breakers[key] = breaker
+        return breaker
+
+    def add_listener(self, callback):
+        """Register a state-change callback on all current and future breakers."""
+        with self._lock:
+            previous = self._on_state_change
+            if previous is None:
+                self._on_state_change = callback
+            else:
+                def chained(breaker, old, new):
+                    previous(breaker, old, new)
+                    callback(breaker, old, new)
+                self._on_state_change = chained
+            for breaker in self._breakers.values():
+                breaker.add_listener(callback)
+
+    def stats(self) -> dict:
+        return {key: breaker.stats() for key, breaker in list(self._breakers.items())}
+
+
+class DeadlineExecutor:
+    """Shared, bounded pool of daemon worker threads for deadline-limited calls.
+
+    Unlike a per-call ``ThreadPoolExecutor`` this never blocks on shutdown: a
+    caller whose deadline expires returns immediately and the runaway call is
+    left to finish in the background (counted as abandoned). Workers are
+    daemon threads, so abandoned calls never hold up interpreter exit.
+
+    Parameters:
+      max_workers: upper bound on worker threads; extra calls queue, and the
+        queueing time counts against their deadline
+    """
+
+    def __init__(self, max_workers: int = 32):
+        self.max_workers = max_workers
+        self._queue: queue.SimpleQueue = queue.SimpleQueue()
+        self._idle = threading.Semaphore(0)
+        self._lock = threading.Lock()
+        self._threads = 0
+        self._local = threading.local()
+        self.submitted = 0
+        self.timeouts = 0
+        self.cancelled = 0
+        self.abandoned_total = 0
+        self.abandoned_running = 0
+
+    def in_worker(self) -> bool:
+        return getattr(self._local, "active", False)
+
+    def submit(self, func, *args, **kwargs) -> concurrent.futures.Future:
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        self._queue.put((fut, func, args, kwargs))
+        if not self._idle.acquire(blocking=False):
+            with self._lock:
+                self.submitted += 1
+                if self._threads < self.max_workers:
+                    self._threads += 1
+                    threading.Thread(target=self._worker, name=f"deadline-{self._threads}", daemon=True).start()
+        else:
+            with self._lock:
+                self.submitted += 1
+        return fut
+
+    def _worker(self):
+        self._local.active = True
+        while True:
+            fut, func, args, kwargs = self._queue.get()
+            if fut.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    fut.set_exception(e)
+                else:
+                    fut.set_result(result)
+            del fut, func, args, kwargs
+            self._idle.release()
+
+    def _on_abandoned_done(self, _fut):
+        with self._lock:
+            self.abandoned_running -= 1
+
+    def run(self, timeout: float, func, *args, **kwargs):
+        """Run ``func`` on the pool and return its result, or raise TimeoutError at the deadline."""
+        return self._wait(self.submit(func, *args, **kwargs), timeout)
+
+    def run_nested(self, timeout: float, func, *args, **kwargs):
+        """Like ``run`` but on a dedicated daemon thread, for calls made from a pool worker.
+
+        A worker waiting on the pool for its own nested call could deadlock once
+        every worker is doing the same, so nested calls never queue behind it.
+        """
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+
+        def target():
+            self._local.active = True
+            if fut.set_running_or_notify_cancel():
+                try:
+                    result = func(*args, **kwargs)
+                except BaseException as e:
+                    fut.set_exception(e)
+                else:
+                    fut.set_result(result)
+
+        with self._lock:
+            self.submitted += 1
+        threading.Thread(target=target, name="deadline-nested", daemon=True).start()
+        return self._wait(fut, timeout)
+
+    def _wait(self, fut: concurrent.futures.Future, timeout: float):
+        try:
+            return fut.result(timeout=timeout)
+        except concurrent.futures.TimeoutError as e:
+            # cancel() only succeeds if the call is still queued; otherwise abandon it
+            cancelled = fut.cancel()
+            with self._lock:
+                self.timeouts += 1
+                if cancelled:
+                    self.cancelled += 1
+                else:
+                    self.abandoned_total += 1
+                    self.abandoned_running += 1
+            if not cancelled:
+                fut.add_done_callback(self._on_abandoned_done)
+            raise TimeoutError(f"Function call timed out after {timeout:g} seconds") from e
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "threads": self._threads,
+                "submitted": self.submitted,
+                "timeouts": self.timeouts,
+                "cancelled": self.cancelled,
+                "abandoned_total": self.abandoned_total,
+                "abandoned_running": self.abandoned_running,
+            }
+
+
+_DEADLINE_EXECUTOR = DeadlineExecutor(max_workers=int(os.getenv("TIMED_MAX_WORKERS", "32")))
+
+# absolute time.monotonic() deadline of the innermost enclosing timed call
+_deadline: contextvars.ContextVar[float | None] = contextvars.ContextVar("timed_deadline", default=None)
+
+
+def deadline_stats() -> dict:
+    """Counters for the shared deadline executor used by ``timed``."""
+    return _DEADLINE_EXECUTOR.stats()
+
+
+if hasattr(asyncio, "timeout"):
+    async def _await_with_timeout(coro, timeout: float):
+        async with asyncio.timeout(timeout):
+            return await coro
+else:  # Python 3.10
+    async def _await_with_timeout(coro, timeout: float):
+        return await asyncio.wait_for(coro, timeout)
+
+
+def _effective_deadline(timeout: float) -> tuple[float, float]:
+    """Return (deadline, seconds left) for a call limited to ``timeout`` inside any enclosing timed call."""
+    now = time.monotonic()
+    deadline = now + timeout
+    outer = _deadline.get()
+    if outer is not None and outer < deadline:
+        deadline = outer
+    remaining = deadline - now
+    if remaining <= 0:
+        raise TimeoutError("Function call timed out: enclosing deadline already passed")
+    return deadline, remaining
+
+
+def _call_with_deadline(deadline: float, func, args, kwargs):
+    _deadline.set(deadline)  # runs inside a copied context, so this never leaks to the caller
+    return func(*args, **kwargs)
+
+
+def timed(timeout: float, executor: DeadlineExecutor | None = None):
+    """Decorator that raises TimeoutError if the call does not finish within ``timeout`` seconds.
+
+    Sync functions run on a shared bounded ``DeadlineExecutor``; the caller gets
+    control back at the deadline even if the call keeps running. Coroutine
+    functions are awaited under ``asyncio.timeout`` and cancelled on expiry.
+    Nested timed calls get ``min(timeout, time left on the outer deadline)``;
+    a sync one made from a pool worker runs on its own thread rather than
+    queueing behind its caller, so nested calls cannot starve the pool.
+    """
+
+    def deco(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                deadline, remaining = _effective_deadline(timeout)
+                token = _deadline.set(deadline)
+                try:
+                    return await _await_with_timeout(func(*args, **kwargs), remaining)
+                except asyncio.TimeoutError as e:
+                    raise TimeoutError(f"Function call timed out after {remaining:g} seconds") from e
+                finally:
+                    _deadline.reset(token)
+
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            ex = executor or _DEADLINE_EXECUTOR
+            deadline, remaining = _effective_deadline(timeout)
+            # carry contextvars (e.g. the current tracing span) into the worker thread
+            ctx = contextvars.copy_context()
+            if ex.in_worker():
+                return ex.run_nested(remaining, ctx.run, _call_with_deadline, deadline, func, args, kwargs)
+            return ex.run(remaining, ctx.run, _call_with_deadline, deadline, func, args, kwargs)
+
+        return wrapper
+
+    return deco
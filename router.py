@@ -0,0 +1,382 @@
+"""Latency-aware routing of chat requests across several model backends.
+
+Each backend (an Ollama host or an OpenAI-compatible endpoint) keeps an EWMA
+of its latency and error rate plus a circuit breaker from the shared
+``BreakerRegistry``. A request goes to the best-scoring healthy backend in
+the highest-priority tier (Ollama hosts before OpenAI fallbacks). If it has
+not answered by that backend's recent latency percentile, a hedge request
+goes to the next-best backend in the same tier and the first answer wins.
+Failures and open breakers fall through to the remaining backends,
+including lower tiers.
+"""
+import asyncio
+import collections
+import concurrent.futures
+import os
+import threading
+import time
+from typing import Any
+
+from langchain_core.language_models import BaseChatModel
+from langchain_core.outputs import ChatGeneration, ChatResult
+from pydantic import ConfigDict
+
+from resilience import BreakerRegistry, CircuitBreakerError
+
+DEFAULT_OLLAMA_MODEL = "gemma3:latest"
+DEFAULT_OPENAI_MODEL = "gpt-4o-mini"
+
+# context window and output cap; also used to budget prompt size before sending
+OLLAMA_NUM_CTX = 16384         # 8k–32k is a good default
+OLLAMA_NUM_PREDICT = 512
+# how long Ollama keeps the weights resident after a request; sent with every call
+OLLAMA_KEEP_ALIVE = os.getenv("OLLAMA_KEEP_ALIVE", "30m")
+
+OLLAMA_NUM_THREAD = os.cpu_count()
+# layers offloaded to the GPU (Ollama's num_gpu counts layers, not devices); unset lets Ollama decide
+OLLAMA_NUM_GPU = int(os.environ["OLLAMA_NUM_GPU"]) if os.getenv("OLLAMA_NUM_GPU") else None
+
+
+def make_ollama_llm(base_url: str | None = None, model: str = DEFAULT_OLLAMA_MODEL):
+    """Construct the ChatOllama client used for summaries (``base_url=None`` uses OLLAMA_URL/the default)."""
+    # backend SDKs are imported on first use so unused backends cost nothing at startup
+    from langchain_ollama import ChatOllama
+
+    kwargs = {"base_url": base_url} if base_url else {}
+    return ChatOllama(temperature=0, model=model, num_ctx=OLLAMA_NUM_CTX, num_predict=OLLAMA_NUM_PREDICT,
+                      keep_alive=OLLAMA_KEEP_ALIVE, num_thread=OLLAMA_NUM_THREAD, num_gpu=OLLAMA_NUM_GPU, **kwargs)
+
+
+def make_openai_llm(base_url: str | None = None, model: str = DEFAULT_OPENAI_MODEL, api_key: str | None = None):
+    """Construct a ChatOpenAI client for the official API or an OpenAI-compatible server."""
+    from langchain_openai import ChatOpenAI
+
+    kwargs = {"base_url": base_url} if base_url else {}
+    if api_key:
+        kwargs["api_key"] = api_key
+    return ChatOpenAI(temperature=0, model=model, **kwargs)
+
+
+class Backend:
+    """One routable model endpoint and its running health statistics."""
+
+    def __init__(self, name: str, llm, priority: int = 0, alpha: float = 0.2, history: int = 200,
+                 error_half_life: float = 10.0):
+        self.name = name
+        self.llm = llm
+        self.priority = priority
+        self.alpha = alpha
+        self.error_half_life = error_half_life
+        self.latency: float | None = None  # EWMA seconds, None until the first sample
+        self.error_rate = 0.0              # EWMA of 0/1 failure indicator, as of the last sample
+        self.inflight = 0
+        self._samples: collections.deque[float] = collections.deque(maxlen=history)
+        self._updated = time.monotonic()
+        self._explored = 0.0
+        self._lock = threading.Lock()
+
+    def current_error_rate(self, now: float | None = None) -> float:
+        """Error EWMA decayed by time since the last sample.
+
+        A backend that stops getting traffic after a burst of errors would
+        otherwise keep its error rate forever and never be picked again.
+        """
+        if self.error_half_life <= 0:
+            return self.error_rate
+        now = time.monotonic() if now is None else now
+        return self.error_rate * 0.5 ** (max(0.0, now - self._updated) / self.error_half_life)
+
+    def record(self, elapsed: float | None, failed: bool):
+        with self._lock:
+            now = time.monotonic()
+            rate = self.current_error_rate(now)
+            self.error_rate = rate + self.alpha * (float(failed) - rate)
+            self._updated = now
+            if elapsed is not None and not failed:
+                self._samples.append(elapsed)
+                self.latency = elapsed if self.latency is None else self.latency + self.alpha * (elapsed - self.latency)
+
+    def claim_exploration(self, interval: float, now: float) -> bool:
+        """True (at most once per ``interval``) if the backend has had no sample for ``interval`` seconds."""
+        with self._lock:
+            if interval <= 0 or now - max(self._updated, self._explored) < interval:
+                return False
+            self._explored = now
+            return True
+
+    def percentile(self, q: float, min_samples: int) -> float | None:
+        with self._lock:
+            if len(self._samples) < min_samples:
+                return None
+            ordered = sorted(self._samples)
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    def score(self) -> float:
+        # unmeasured backends score low so they get tried, unless they have only ever failed;
+        # load and errors inflate the rest
+        error_rate = self.current_error_rate()
+        if self.latency is None:
+            return error_rate * 60.0
+        return self.latency * (1 + self.inflight) / max(1e-3, 1.0 - error_rate)
+
+    def stats(self) -> dict:
+        return {
+            "name": self.name,
+            "priority": self.priority,
+            "latency_ewma": self.latency,
+            "error_rate_ewma": round(self.current_error_rate(), 4),
+            "inflight": self.inflight,
+            "samples": len(self._samples),
+        }
+
+
+class BackendRouter:
+    """Pick, hedge and fail over between backends.
+
+    Parameters:
+      backends: list of ``Backend``
+      breakers: registry providing one breaker per backend (keyed ``backend:<name>``)
+      hedge_percentile: latency percentile after which a hedge request is sent
+      hedge_min_samples: samples a backend needs before hedging is enabled for it
+      max_workers: size of the thread pool used for hedged sync calls
+      explore_interval: seconds without a sample after which a backend in the
+        best tier gets one request as primary, so its statistics stay current
+        (0 disables exploration)
+    """
+
+    def __init__(self, backends: list[Backend], breakers: BreakerRegistry | None = None,
+                 hedge_percentile: float = 0.95, hedge_min_samples: int = 20, max_workers: int = 32,
+                 explore_interval: float = 5.0, **breaker_options):
+        if not backends:
+            raise ValueError("at least one backend is required")
+        self.backends = backends
+        self.breakers = breakers or BreakerRegistry()
+        self.breaker_options = breaker_options
+        self.hedge_percentile = hedge_percentile
+        self.hedge_min_samples = hedge_min_samples
+        self.explore_interval = explore_interval
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="router")
+        self.counters = {"requests": 0, "hedges": 0, "hedge_wins": 0, "failovers": 0, "explorations": 0}
+        self._lock = threading.Lock()
+
+    def breaker(self, backend: Backend):
+        return self.breakers.get(f"backend:{backend.name}", **self.breaker_options)
+
+    def _count(self, name: str):
+        with self._lock:
+            self.counters[name] += 1
+
+    def ranked(self) -> list[Backend]:
+        """Healthy backends best-first: by priority tier, then score. Open breakers go last.
+
+        A breaker past its recovery timeout counts as half-open (eligible) here,
+        since it only actually leaves OPEN when the next call is admitted.
+        """
+        def key(b):
+            return (self.breaker(b).effective_state == "OPEN", b.priority, b.score())
+
+        ranked = sorted(self.backends, key=key)
+        best = ranked[0]
+        if self.explore_interval > 0 and self.breaker(best).effective_state != "OPEN":
+            now = time.monotonic()
+            for i, backend in enumerate(ranked[1:], 1):
+                if backend.priority != best.priority or self.breaker(backend).effective_state == "OPEN":
+                    break
+                if backend.claim_exploration(self.explore_interval, now):
+                    self._count("explorations")
+                    ranked.insert(0, ranked.pop(i))
+                    break
+        return ranked
+
+    def _hedge_delay(self, backend: Backend) -> float | None:
+        return backend.percentile(self.hedge_percentile, self.hedge_min_samples)
+
+    def _hedge_candidate(self, primary: Backend, candidates: list[Backend]) -> Backend | None:
+        """Best remaining backend in the primary's tier; lower tiers are for failover only."""
+        for backend in candidates:
+            if backend.priority == primary.priority and self.breaker(backend).effective_state != "OPEN":
+                return backend
+        return None
+
+    # -- sync path ------------------------------------------------------
+    def _call(self, backend: Backend, messages, kwargs):
+        with backend._lock:
+            backend.inflight += 1
+        start = time.monotonic()
+        try:
+            result = self.breaker(backend).call(backend.llm.invoke, messages, **kwargs)
+        except CircuitBreakerError:
+            raise
+        except Exception:
+            backend.record(None, True)
+            raise
+        else:
+            backend.record(time.monotonic() - start, False)
+            return result
+        finally:
+            with backend._lock:
+                backend.inflight -= 1
+
+    def invoke(self, messages, **kwargs):
+        """Send ``messages`` to the best backend, hedging and failing over as needed."""
+        self._count("requests")
+        candidates = self.ranked()
+        last_error: BaseException | None = None
+        while candidates:
+            primary = candidates.pop(0)
+            hedge = self._hedge_candidate(primary, candidates)
+            delay = self._hedge_delay(primary) if hedge is not None else None
+            fut = self._pool.submit(self._call, primary, messages, kwargs)
+            pending = {fut: primary}
+            if delay is not None:
+                done, _ = concurrent.futures.wait([fut], timeout=delay)
+                if not done:
+                    candidates.remove(hedge)
+                    self._count("hedges")
+                    pending[self._pool.submit(self._call, hedge, messages, kwargs)] = hedge
+            while pending:
+                done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+                for f in done:
+                    backend = pending.pop(f)
+                    try:
+                        result = f.result()
+                    except Exception as e:
+                        last_error = e
+                        continue
+                    if backend is not primary:
+                        self._count("hedge_wins")
+                    return result
+            self._count("failovers")
+        raise last_error or CircuitBreakerError("no backend available")
+
+    # -- async path -----------------------------------------------------
+    async def _acall(self, backend: Backend, messages, kwargs):
+        backend.inflight += 1
+        start = time.monotonic()
+        try:
+            result = await self.breaker(backend).acall(backend.llm.ainvoke, messages, **kwargs)
+        except CircuitBreakerError:
+            raise
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            backend.record(None, True)
+            raise
+        else:
+            backend.record(time.monotonic() - start, False)
+            return result
+        finally:
+            backend.inflight -= 1
+
+    async def ainvoke(self, messages, **kwargs):
+        """Async ``invoke``; the losing side of a hedge is cancelled."""
+        self._count("requests")
+        candidates = self.ranked()
+        last_error: BaseException | None = None
+        while candidates:
+            primary = candidates.pop(0)
+            hedge = self._hedge_candidate(primary, candidates)
+            delay = self._hedge_delay(primary) if hedge is not None else None
+            task = asyncio.ensure_future(self._acall(primary, messages, kwargs))
+            pending = {task: primary}
+            if delay is not None:
+                done, _ = await asyncio.wait([task], timeout=delay)
+                if not done:
+                    candidates.remove(hedge)
+                    self._count("hedges")
+                    pending[asyncio.ensure_future(self._acall(hedge, messages, kwargs))] = hedge
+            try:
+                while pending:
+                    done, _ = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                    for t in done:
+                        backend = pending.pop(t)
+                        try:
+                            result = t.result()
+                        except Exception as e:
+                            last_error = e
+                            continue
+                        if backend is not primary:
+                            self._count("hedge_wins")
+                        return result
+            finally:
+                for t in pending:
+                    t.cancel()
+            self._count("failovers")
+        raise last_error or CircuitBreakerError("no backend available")
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {
+            **counters,
+            "backends": [dict(b.stats(), breaker=self.breaker(b).state) for b in self.backends],
+        }
+
+
+class RoutedChatModel(BaseChatModel):
+    """Chat model facade over a ``BackendRouter`` so it composes as ``prompt | llm``."""
+
+    model_config = ConfigDict(arbitrary_types_allowed=True)
+
+    router: Any
+    model: str = "router"
+    temperature: float | None = 0
+    num_ctx: int | None = None
+    num_predict: int | None = None
+
+    @property
+    def _llm_type(self) -> str:
+        return "routed-chat"
+
+    def _generate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if stop is not None:
+            kwargs["stop"] = stop
+        message = self.router.invoke(messages, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+    async def _agenerate(self, messages, stop=None, run_manager=None, **kwargs) -> ChatResult:
+        if stop is not None:
+            kwargs["stop"] = stop
+        message = await self.router.ainvoke(messages, **kwargs)
+        return ChatResult(generations=[ChatGeneration(message=message)])
+
+
+def _split_urls(value: str | None) -> list[str]:
+    return [u.strip().rstrip("/") for u in (value or "").split(",") if u.strip()]
+
+
+def build_router(ollama_urls: list[str], openai_urls: list[str] | None = None,
+                 breakers: BreakerRegistry | None = None,
+                 ollama_model: str = DEFAULT_OLLAMA_MODEL, openai_model: str = DEFAULT_OPENAI_MODEL,
+                 openai_api_key: str | None = None, **router_options) -> RoutedChatModel:
+    """Build a ``RoutedChatModel`` over Ollama hosts with optional OpenAI-compatible fallbacks."""
+    backends = [Backend(f"ollama:{url}", make_ollama_llm(url, ollama_model), priority=0) for url in ollama_urls]
+    backends += [
+        Backend(f"openai:{url}", make_openai_llm(url, openai_model, openai_api_key), priority=1)
+        for url in openai_urls or []
+    ]
+    router = BackendRouter(backends, breakers, **router_options)
+    models = sorted({getattr(b.llm, "model", None) or b.llm.model_name for b in backends})
+    first = backends[0].llm
+    return RoutedChatModel(
+        router=router,
+        model="router:" + ",".join(models),
+        num_ctx=getattr(first, "num_ctx", None),
+        num_predict=getattr(first, "num_predict", None),
+    )
+
+
+def router_from_env(breakers: BreakerRegistry | None = None, **router_options) -> RoutedChatModel | None:
+    """Build a router from ``OLLAMA_URLS`` / ``OPENAI_FALLBACK_URLS``; None if only one backend is configured."""
+    ollama_urls = _split_urls(os.getenv("OLLAMA_URLS"))
+    openai_urls = _split_urls(os.getenv("OPENAI_FALLBACK_URLS"))
+    if len(ollama_urls) + len(openai_urls) < 2:
+        return None
+    return build_router(
+        ollama_urls,
+        openai_urls,
+        breakers=breakers,
+        ollama_model=os.getenv("OLLAMA_MODEL", DEFAULT_OLLAMA_MODEL),
+        openai_model=os.getenv("OPENAI_MODEL", DEFAULT_OPENAI_MODEL),
+        **router_options,
+    )
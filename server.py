@@ -0,0 +1,296 @@
+"""Long-running summarization HTTP server.
+
+Discovery, client construction and the invoke path are set up once at
+startup and shared by every request, so the model client's connection pool
+stays warm and Ollama keeps the weights resident (``OLLAMA_KEEP_ALIVE``).
+
+Requests are queued on a bounded queue and drained by a dispatcher that
+groups them into small batches (identical texts in a batch share one
+summary). When the queue is full the server answers 503 with
+``Retry-After`` instead of piling up work.
+
+    python server.py --port 8080
+    curl -s localhost:8080/summarize -d '{"text": "..."}'
+
+Endpoints: ``POST /summarize`` (JSON ``{"text": ...}`` or a plain-text
+body), ``GET /healthz`` and, with telemetry enabled, ``GET /metrics``.
+"""
+import argparse
+import collections
+import concurrent.futures
+import http.server
+import json
+import os
+import queue
+import threading
+import time
+
+import telemetry
+from main import (
+    BREAKERS,
+    build_llm,
+    llm_breaker,
+    make_cache,
+    make_invoke,
+    resolve_ollama_base,
+    summarize_text,
+)
+from ollama_discovery import get_session
+from resilience import CircuitBreakerError, deadline_stats
+from router import OLLAMA_KEEP_ALIVE, RoutedChatModel
+
+
+class QueueFullError(RuntimeError):
+    pass
+
+
+class SummaryService:
+    """Warm model client plus a bounded, batching request queue.
+
+    Parameters:
+      llm: chat model shared by all requests
+      invoke: ``invoke(chain, input_dict)`` call path (deadline, breaker, cache)
+      max_queue: queued requests before new ones are rejected
+      batch_size: maximum requests taken off the queue per batch
+      batch_wait: seconds the dispatcher waits to fill a batch
+      concurrency: documents summarized at the same time
+    """
+
+    def __init__(self, llm, invoke, max_queue: int = 64, batch_size: int = 8, batch_wait: float = 0.01,
+                 concurrency: int = 4):
+        self.llm = llm
+        self.invoke = invoke
+        self.batch_size = batch_size
+        self.batch_wait = batch_wait
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._slots = threading.BoundedSemaphore(concurrency)
+        self._pool = concurrent.futures.ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="summarize")
+        self._lock = threading.Lock()
+        self.counters = {"accepted": 0, "rejected": 0, "batches": 0, "deduplicated": 0, "completed": 0,
+                         "failed": 0, "cancelled": 0}
+        self._dispatcher = threading.Thread(target=self._dispatch, name="dispatcher", daemon=True)
+        self._dispatcher.start()
+
+    def _count(self, name: str, n: int = 1):
+        with self._lock:
+            self.counters[name] += n
+
+    def submit(self, text: str) -> concurrent.futures.Future:
+        """Queue ``text``; raises QueueFullError when the queue is at capacity.
+
+        Cancelling the returned future before its batch starts drops the work.
+        """
+        fut: concurrent.futures.Future = concurrent.futures.Future()
+        try:
+            self._queue.put_nowait((text, fut))
+        except queue.Full:
+            self._count("rejected")
+            raise QueueFullError("summary queue is full") from None
+        self._count("accepted")
+        return fut
+
+    def _next_batch(self) -> list:
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.batch_wait
+        while len(batch) < self.batch_size:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=max(0.0, remaining)) if remaining > 0
+                             else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _dispatch(self):
+        while True:
+            batch = self._next_batch()
+            self._count("batches")
+            groups: dict[str, list] = collections.defaultdict(list)
+            for text, fut in batch:
+                groups[text].append(fut)
+            self._count("deduplicated", len(batch) - len(groups))
+            for text, futures in groups.items():
+                # blocks while all workers are busy, so the queue (not the pool) absorbs bursts
+                self._slots.acquire()
+                # drop requests whose caller already gave up (cancelled on timeout) and shed the
+                # whole group if nobody is left waiting for it
+                live = [fut for fut in futures if fut.set_running_or_notify_cancel()]
+                self._count("cancelled", len(futures) - len(live))
+                if not live:
+                    self._slots.release()
+                    continue
+                self._pool.submit(self._run, text, live)
+
+    def _run(self, text: str, futures: list):
+        try:
+            result = summarize_text(text, self.llm, self.invoke)
+        except BaseException as e:
+            self._count("failed")
+            for fut in futures:
+                fut.set_exception(e)
+        else:
+            self._count("completed")
+            for fut in futures:
+                fut.set_result(result)
+        finally:
+            self._slots.release()
+
+    def stats(self) -> dict:
+        with self._lock:
+            counters = dict(self.counters)
+        return {**counters, "queued": self._queue.qsize(), "queue_capacity": self._queue.maxsize}
+
+
+def preload_model(base_url: str | None, model: str, timeout: float = 120.0):
+    """Ask Ollama to load ``model`` now and keep it for ``OLLAMA_KEEP_ALIVE``."""
+    if not base_url:
+        return
+    try:
+        get_session().post(f"{base_url}/api/generate", json={"model": model, "keep_alive": OLLAMA_KEEP_ALIVE},
+                           timeout=timeout)
+    except Exception as e:
+        print(f"Model preload failed (continuing): {e}")
+
+
+def preload_targets(llm, ollama_base: str | None) -> list[tuple[str, str]]:
+    """(base_url, model) of every Ollama client behind ``llm``; OpenAI fallbacks are not preloaded."""
+    if isinstance(llm, RoutedChatModel):
+        return [(backend.llm.base_url, backend.llm.model) for backend in llm.router.backends
+                if backend.name.startswith("ollama:") and backend.llm.base_url]
+    if type(llm).__name__ == "ChatOllama":
+        base_url = llm.base_url or ollama_base
+        return [(base_url, llm.model)] if base_url else []
+    return []
+
+
+def make_handler(service: SummaryService, request_timeout: float):
+    class Handler(http.server.BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"
+
+        def log_message(self, *args):
+            pass
+
+        def _send(self, status: int, payload, content_type: str = "application/json", headers=None):
+            body = payload if isinstance(payload, bytes) else json.dumps(payload).encode()
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            for name, value in (headers or {}).items():
+                self.send_header(name, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            if self.path == "/healthz":
+                self._send(200, {"service": service.stats(), "breakers": BREAKERS.stats(),
+                                 "deadline_executor": deadline_stats()})
+            elif self.path == "/metrics" and telemetry.enabled():
+                self._send(200, telemetry.render_prometheus().encode(), "text/plain; version=0.0.4")
+            else:
+                self._send(404, {"error": "not found"})
+
+        def do_POST(self):
+            # consume the body before any reply so leftover bytes are never parsed as the next request
+            try:
+                length = int(self.headers.get("Content-Length") or 0)
+                if length < 0:
+                    raise ValueError(length)
+            except ValueError:
+                # the body's extent is unknown, so this connection cannot be reused
+                self._send(400, {"error": "invalid Content-Length"}, headers={"Connection": "close"})
+                return
+            body = self.rfile.read(length)
+            if self.path != "/summarize":
+                self._send(404, {"error": "not found"})
+                return
+            try:
+                raw = body.decode("utf-8")
+            except UnicodeDecodeError:
+                self._send(400, {"error": "body must be UTF-8 text"})
+                return
+            if (self.headers.get("Content-Type") or "").startswith("application/json"):
+                try:
+                    text = json.loads(raw)["text"]
+                    if not isinstance(text, str):
+                        raise TypeError("text must be a string")
+                except (ValueError, KeyError, TypeError):
+                    self._send(400, {"error": 'expected JSON body {"text": "..."}'})
+                    return
+            else:
+                text = raw
+            if not text.strip():
+                self._send(400, {"error": "empty text"})
+                return
+            started = time.perf_counter()
+            try:
+                fut = service.submit(text)
+            except QueueFullError as e:
+                self._send(503, {"error": str(e)}, headers={"Retry-After": "1"})
+                return
+            try:
+                result = fut.result(timeout=request_timeout)
+            except concurrent.futures.TimeoutError:
+                fut.cancel()  # nobody will read this answer; shed it if it has not started yet
+                self._send(504, {"error": f"no result within {request_timeout} seconds"})
+                return
+            except CircuitBreakerError as e:
+                self._send(503, {"error": f"LLM circuit open or prevented call: {e}"}, headers={"Retry-After": "5"})
+                return
+            except TimeoutError as e:
+                self._send(504, {"error": f"LLM invocation timed out: {e}"})
+                return
+            except Exception as e:
+                self._send(502, {"error": f"LLM invocation failed: {e}"})
+                return
+            self._send(200, {"summary": getattr(result, "content", result),
+                             "elapsed": round(time.perf_counter() - started, 3)})
+
+    return Handler
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve summaries over HTTP with a warm model client.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=int(os.getenv("SUMMARY_SERVER_PORT", "8080")))
+    parser.add_argument("--max-queue", type=int, default=64, help="queued requests before answering 503")
+    parser.add_argument("--batch-size", type=int, default=8)
+    parser.add_argument("--batch-wait-ms", type=float, default=10.0)
+    parser.add_argument("--concurrency", type=int, default=4, help="documents summarized at the same time")
+    parser.add_argument("--request-timeout", type=float, default=120.0)
+    parser.add_argument("--no-preload", action="store_true", help="skip loading the model at startup")
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    args = parse_args(argv)
+    telemetry.configure_from_env()
+    ollama_base = resolve_ollama_base()
+    with telemetry.span("client_construction"):
+        llm = build_llm(ollama_base)
+    if not args.no_preload:
+        targets = preload_targets(llm, ollama_base)
+        if targets:
+            # hosts load their weights independently, so don't wait for them one by one
+            with concurrent.futures.ThreadPoolExecutor(max_workers=len(targets)) as pool:
+                list(pool.map(lambda target: preload_model(*target), targets))
+    _invoke = make_invoke(llm_breaker(ollama_base, llm), verbose=False)
+    cache = make_cache()
+    invoke = cache.wrap(_invoke) if cache is not None else _invoke
+    service = SummaryService(llm, invoke, max_queue=args.max_queue, batch_size=args.batch_size,
+                             batch_wait=args.batch_wait_ms / 1000, concurrency=args.concurrency)
+    httpd = http.server.ThreadingHTTPServer((args.host, args.port), make_handler(service, args.request_timeout))
+    httpd.daemon_threads = True
+    print(f"Serving summaries on http://{args.host}:{httpd.server_address[1]}/summarize")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        if cache is not None:
+            cache.close()
+        telemetry.flush()
+
+
+if __name__ == "__main__":
+    main()
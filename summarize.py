@@ -0,0 +1,181 @@
+import concurrent.futures
+import contextvars
+import re
+
+from langchain_core.prompts import PromptTemplate
+
+# Rough chars-per-token ratio for English text; good enough for budgeting chunks.
+CHARS_PER_TOKEN = 4
+
+MAP_TEMPLATE = """
+You are given one excerpt of a longer biographical text about a single person.
+
+STRICT INSTRUCTIONS:
+- Use ONLY the information in the excerpt below. Do NOT use prior knowledge.
+- Extract concise factual notes: identity, dates, places, family, early life,
+  career milestones, records and awards.
+- Keep names, numbers and dates exactly as written.
+- Do NOT write the final summary sections; output bullet-point notes only.
+
+EXCERPT:
+{information}
+
+Now write the notes.
+"""
+
+map_prompt_template = PromptTemplate(
+    input_variables=["information"],
+    template=MAP_TEMPLATE,
+)
+
+_SENTENCE_RE = re.compile(r"(?<=[.!?])\s+")
+
+
+def estimate_tokens(text: str) -> int:
+    """Cheap token estimate used for budgeting (no tokenizer dependency)."""
+    return (len(text) + CHARS_PER_TOKEN - 1) // CHARS_PER_TOKEN
+
+
+def _is_heading(line: str) -> bool:
+    # Section titles in pasted articles are short lines without terminal punctuation.
+    line = line.strip()
+    return 0 < len(line) <= 80 and line[-1] not in ".!?:;,\"'])"
+
+
+def split_paragraphs(text: str) -> list[str]:
+    """Split text into paragraphs, keeping section headings attached to what follows."""
+    blocks = []
+    pending_heading = []
+    for para in re.split(r"\n\s*\n", text):
+        para = para.strip()
+        if not para:
+            continue
+        lines = para.splitlines()
+        # peel off leading heading lines ("Early life and background\nTendulkar was...")
+        while len(lines) > 1 and _is_heading(lines[0]):
+            pending_heading.append(lines.pop(0).strip())
+        body = "\n".join(lines).strip()
+        if len(lines) == 1 and _is_heading(body):
+            pending_heading.append(body)
+            continue
+        if pending_heading:
+            body = "\n".join(pending_heading + [body])
+            pending_heading = []
+        blocks.append(body)
+    if pending_heading:
+        blocks.append("\n".join(pending_heading))
+    return blocks
+
+
+def _split_oversized(block: str, max_tokens: int) -> list[str]:
+    """Break a single paragraph that exceeds the budget on sentence boundaries."""
+    pieces = []
+    current = ""
+    for sentence in _SENTENCE_RE.split(block):
+        if estimate_tokens(sentence) > max_tokens:
+            # pathological run-on text: hard-split by characters
+            step = max_tokens * CHARS_PER_TOKEN
+            if current:
+                pieces.append(current)
+                current = ""
+            pieces.extend(sentence[i:i + step] for i in range(0, len(sentence), step))
+            continue
+        candidate = f"{current} {sentence}" if current else sentence
+        if estimate_tokens(candidate) > max_tokens:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = candidate
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text: str, max_tokens: int) -> list[str]:
+    """Split text into chunks of at most ``max_tokens`` estimated tokens.
+
+    Chunks are built greedily from whole paragraphs/sections; only paragraphs
+    that are larger than the budget on their own are split further.
+    """
+    if max_tokens <= 0:
+        raise ValueError("max_tokens must be positive")
+    chunks = []
+    current: list[str] = []
+    current_tokens = 0
+    for block in split_paragraphs(text):
+        block_tokens = estimate_tokens(block)
+        if block_tokens > max_tokens:
+            parts = _split_oversized(block, max_tokens)
+        else:
+            parts = [block]
+        for part in parts:
+            part_tokens = estimate_tokens(part) + 1  # +1 for the joining blank line
+            if current and current_tokens + part_tokens > max_tokens:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            current.append(part)
+            current_tokens += part_tokens
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
+
+def _content(result) -> str:
+    return getattr(result, "content", result)
+
+
+def _map(invoke, llm, chunks: list[str], max_workers: int) -> list[str]:
+    """Summarize chunks in parallel; results keep the original chunk order."""
+    map_chain = map_prompt_template | llm
+    workers = max(1, min(max_workers, len(chunks)))
+    with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as ex:
+        # each task runs in a copy of the caller's context so tracing spans keep their parent
+        futures = [
+            ex.submit(contextvars.copy_context().run, invoke, map_chain, {"information": chunk})
+            for chunk in chunks
+        ]
+        try:
+            return [_content(f.result()) for f in futures]
+        except BaseException:
+            for f in futures:
+                f.cancel()
+            raise
+
+
+def map_reduce_summarize(
+    information: str,
+    reduce_prompt,
+    llm,
+    invoke,
+    max_chunk_tokens: int = 2048,
+    max_workers: int = 4,
+    max_rounds: int = 3,
+    pack=None,
+):
+    """Summarize ``information`` with a map-reduce pass over token-budgeted chunks.
+
+    ``invoke(chain, input_dict)`` is the call path used for every model request
+    (e.g. ``_invoke`` in ``main.py`` so timeouts and the circuit breaker apply).
+    ``reduce_prompt`` is the final four-section summary prompt; it receives the
+    combined chunk notes as ``information``. Short inputs skip the map step and
+    go straight through ``reduce_prompt``. ``pack(text) -> text``, if given, is
+    applied to that final reduce input only (e.g. to fit it in the context
+    window); the map step always sees the whole document.
+    """
+    pack = pack or (lambda text: text)
+    chunks = split_into_chunks(information, max_chunk_tokens)
+    if len(chunks) <= 1:
+        return invoke(reduce_prompt | llm, {"information": pack(information)})
+
+    notes = _map(invoke, llm, chunks, max_workers)
+    # collapse: if the notes still do not fit the budget, summarize them again
+    for _ in range(max_rounds):
+        combined = "\n\n".join(notes)
+        if estimate_tokens(combined) <= max_chunk_tokens:
+            break
+        regrouped = split_into_chunks(combined, max_chunk_tokens)
+        if len(regrouped) >= len(notes):
+            break  # no progress possible; let the reduce pass see what we have
+        notes = _map(invoke, llm, regrouped, max_workers)
+
+    return invoke(reduce_prompt | llm, {"information": pack("\n\n".join(notes))})
@@ -0,0 +1,235 @@
+"""Lightweight spans, counters and histograms for the summarization pipeline.
+
+Disabled by default; every entry point returns immediately (``span`` hands
+back a shared no-op context manager) until ``configure`` enables it.
+
+Enable from the environment via ``configure_from_env``:
+
+  METRICS_PORT  serve Prometheus text exposition on http://127.0.0.1:<port>/metrics
+  METRICS_FILE  write Prometheus text exposition to this file on ``flush``
+  TRACE_FILE    write a JSON list of recorded spans to this file on ``flush``
+  TELEMETRY=1   record in memory without exporting (e.g. for ``render_prometheus``)
+"""
+import bisect
+import contextlib
+import contextvars
+import http.server
+import itertools
+import json
+import os
+import threading
+import time
+
+# latency buckets in seconds: sub-millisecond stages up to long model calls
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+_HELP = {
+    "summarizer_stage_seconds": ("histogram", "Latency of pipeline stages"),
+    "summarizer_llm_timeouts_total": ("counter", "Model calls that hit their deadline"),
+    "summarizer_breaker_rejections_total": ("counter", "Calls rejected by an open circuit breaker"),
+    "summarizer_breaker_transitions_total": ("counter", "Circuit breaker state transitions"),
+    "summarizer_llm_prompt_tokens_total": ("counter", "Prompt tokens reported by the backend"),
+    "summarizer_llm_completion_tokens_total": ("counter", "Completion tokens reported by the backend"),
+    "summarizer_llm_calls_total": ("counter", "Model calls by outcome"),
+}
+
+_enabled = False
+_tracing = False
+_lock = threading.Lock()
+_counters: dict[tuple, float] = {}
+_histograms: dict[tuple, list] = {}
+_spans: list[dict] = []
+_span_ids = itertools.count(1)
+_current_span: contextvars.ContextVar[int | None] = contextvars.ContextVar("current_span", default=None)
+_epoch = time.time() - time.perf_counter()
+_server: http.server.ThreadingHTTPServer | None = None
+_metrics_file: str | None = None
+_trace_file: str | None = None
+_NOOP = contextlib.nullcontext()
+
+
+def enabled() -> bool:
+    return _enabled
+
+
+def configure(enabled: bool = True, trace: bool = False, metrics_port: int | None = None,
+              metrics_file: str | None = None, trace_file: str | None = None):
+    """Turn instrumentation on or off and choose exporters."""
+    global _enabled, _tracing, _metrics_file, _trace_file
+    _enabled = enabled or bool(metrics_port or metrics_file or trace_file)
+    _tracing = _enabled and (trace or bool(trace_file))
+    _metrics_file = metrics_file
+    _trace_file = trace_file
+    if metrics_port and _server is None:
+        serve_metrics(metrics_port)
+
+
+def configure_from_env():
+    port = os.getenv("METRICS_PORT")
+    configure(
+        enabled=os.getenv("TELEMETRY") == "1",
+        metrics_port=int(port) if port else None,
+        metrics_file=os.getenv("METRICS_FILE") or None,
+        trace_file=os.getenv("TRACE_FILE") or None,
+    )
+
+
+def _key(name: str, labels: dict) -> tuple:
+    return (name, tuple(sorted(labels.items())))
+
+
+def inc(name: str, value: float = 1.0, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        _counters[key] = _counters.get(key, 0.0) + value
+
+
+def observe(name: str, value: float, **labels):
+    if not _enabled:
+        return
+    key = _key(name, labels)
+    with _lock:
+        hist = _histograms.get(key)
+        if hist is None:
+            hist = _histograms[key] = [[0] * len(DEFAULT_BUCKETS), 0.0, 0]
+        index = bisect.bisect_left(DEFAULT_BUCKETS, value)
+        if index < len(DEFAULT_BUCKETS):
+            hist[0][index] += 1
+        hist[1] += value
+        hist[2] += 1
+
+
+@contextlib.contextmanager
+def _span(name: str, attrs: dict):
+    span_id = next(_span_ids)
+    parent = _current_span.get()
+    token = _current_span.set(span_id)
+    start = time.perf_counter()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        elapsed = time.perf_counter() - start
+        _current_span.reset(token)
+        observe("summarizer_stage_seconds", elapsed, stage=name)
+        if _tracing:
+            record = {"id": span_id, "parent": parent, "name": name, "start": _epoch + start,
+                      "duration": elapsed, "thread": threading.current_thread().name}
+            if attrs:
+                record["attrs"] = attrs
+            if error:
+                record["error"] = error
+            with _lock:
+                _spans.append(record)
+
+
+def span(name: str, **attrs):
+    """Context manager timing one pipeline stage (no-op when disabled)."""
+    if not _enabled:
+        return _NOOP
+    return _span(name, attrs)
+
+
+def record_usage(message, **labels):
+    """Count prompt/completion tokens from a chat response's metadata."""
+    if not _enabled or message is None:
+        return
+    usage = getattr(message, "usage_metadata", None) or {}
+    meta = getattr(message, "response_metadata", None) or {}
+    prompt = usage.get("input_tokens", meta.get("prompt_eval_count"))
+    completion = usage.get("output_tokens", meta.get("eval_count"))
+    if prompt:
+        inc("summarizer_llm_prompt_tokens_total", prompt, **labels)
+    if completion:
+        inc("summarizer_llm_completion_tokens_total", completion, **labels)
+
+
+def on_breaker_change(breaker, old: str, new: str):
+    """``BreakerRegistry`` listener counting state transitions."""
+    inc("summarizer_breaker_transitions_total", breaker=breaker.name, from_state=old, to_state=new)
+
+
+def _escape(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(labels: tuple, extra: tuple = ()) -> str:
+    items = labels + extra
+    if not items:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in items) + "}"
+
+
+def render_prometheus() -> str:
+    """Current metrics in Prometheus text exposition format."""
+    with _lock:
+        counters = dict(_counters)
+        histograms = {k: [list(v[0]), v[1], v[2]] for k, v in _histograms.items()}
+    lines = []
+    described = set()
+
+    def header(name):
+        if name not in described:
+            described.add(name)
+            kind, text = _HELP.get(name, ("untyped", name))
+            lines.append(f"# HELP {name} {text}")
+            lines.append(f"# TYPE {name} {kind}")
+
+    for (name, labels), value in sorted(counters.items()):
+        header(name)
+        lines.append(f"{name}{_format_labels(labels)} {value:g}")
+    for (name, labels), (buckets, total, count) in sorted(histograms.items()):
+        header(name)
+        cumulative = 0
+        for bound, n in zip(DEFAULT_BUCKETS, buckets):
+            cumulative += n
+            lines.append(f"{name}_bucket{_format_labels(labels, (('le', f'{bound:g}'),))} {cumulative}")
+        lines.append(f"{name}_bucket{_format_labels(labels, (('le', '+Inf'),))} {count}")
+        lines.append(f"{name}_sum{_format_labels(labels)} {total:.6f}")
+        lines.append(f"{name}_count{_format_labels(labels)} {count}")
+    return "\n".join(lines) + "\n"
+
+
+def trace() -> list[dict]:
+    with _lock:
+        return list(_spans)
+
+
+def serve_metrics(port: int, host: str = "127.0.0.1"):
+    """Serve ``/metrics`` from a daemon thread."""
+    global _server
+
+    class Handler(http.server.BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+            body = render_prometheus().encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+    _server = http.server.ThreadingHTTPServer((host, port), Handler)
+    _server.daemon_threads = True
+    threading.Thread(target=_server.serve_forever, name="metrics", daemon=True).start()
+    return _server
+
+
+def flush():
+    """Write the configured metrics/trace files."""
+    if _metrics_file:
+        with open(_metrics_file, "w", encoding="utf-8") as f:
+            f.write(render_prometheus())
+    if _trace_file:
+        with open(_trace_file, "w", encoding="utf-8") as f:
+            json.dump(trace(), f, indent=2)